@@ -1,36 +1,962 @@
+import argparse
+import base64
+import bisect
+import csv
+import io
+import json
 import os
 import random
+import re
 import sys
-import subprocess
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime
 
-# --- Check and Install pandas (if needed) ---
-try:
-    import pandas as pd
-except ImportError:
-    print("Package 'pandas' not found. Attempting to install...")
+# pandas is imported when a file needs it and Tk only for the file dialog, so the
+# tool starts quickly and also runs without a display (e.g. over SSH)
+
+
+def import_pandas():
     try:
-        # Use subprocess to call pip and install pandas
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pandas'])
-        print("'pandas' installed successfully.")
-        # Try importing again after installation
-        import pandas as pd
-    except subprocess.CalledProcessError as e:
-        print(f"Error: Failed to install 'pandas'. Please install it manually.")
-        print(f"The command 'pip install pandas' failed with error: {e}")
-        # Exit the program if a critical dependency can't be installed
-        sys.exit(1)
+        import pandas
     except ImportError:
-        # Should not happen if installation was successful, but as a fallback
-        print("Error: 'pandas' failed to import even after attempted installation.")
-        sys.exit(1)
+        sys.exit("❌ This file needs the 'pandas' package. Install it with: pip install pandas")
+    return pandas
+
+
+##############################################################################################################################################################################
+
+# ROW SOURCES
+
+# Files at least this large are read lazily instead of loading them into a DataFrame
+LAZY_THRESHOLD_BYTES = 200 * 1024 * 1024
+# Number of rows parsed together whenever a row that is not cached is requested
+READ_AHEAD_ROWS = 32
+# Size of the blocks scanned when building the record offset index
+INDEX_CHUNK_BYTES = 1024 * 1024
+# Rows per batch when a Parquet, Feather or JSONL file is rewritten on save
+WRITE_BATCH_ROWS = 64 * 1024
+
+# Supported file formats, by extension
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".feather": "feather", ".arrow": "feather",
+    ".jsonl": "jsonl", ".ndjson": "jsonl",
+}
+FILE_TYPES = [
+    ("Data files", "*.csv *.parquet *.pq *.feather *.arrow *.jsonl *.ndjson"),
+    ("CSV files", "*.csv"),
+    ("Parquet files", "*.parquet *.pq"),
+    ("Feather files", "*.feather *.arrow"),
+    ("JSON Lines files", "*.jsonl *.ndjson"),
+]
+
+
+def file_format(path):
+    """Format of a data file, judged by its extension (CSV when unknown)"""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def with_data_extension(path, default_ext):
+    """Append default_ext unless the path already ends in a supported extension"""
+    if os.path.splitext(path)[1].lower() in FORMAT_EXTENSIONS:
+        return path
+    return path + default_ext
+
+
+def write_frame(df, path):
+    """Write a whole DataFrame in the format given by the path's extension"""
+    fmt = file_format(path)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(path)
+    elif fmt == "jsonl":
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def value_matches(kind, pattern, value):
+    """Test one cell value: kind is 'regex' (case-insensitive search), 'equals' or 'empty'"""
+    if kind == "regex":
+        return re.search(pattern, value, re.IGNORECASE) is not None
+    if kind == "equals":
+        return value == pattern
+    return value == ""
+
+
+def update_matches(matches, column, row, value):
+    """Keep cached match positions of a column correct after one of its cells was edited"""
+    for (match_column, kind, pattern), rows in matches.items():
+        if match_column != column:
+            continue
+        i = bisect.bisect_left(rows, row)
+        present = i < len(rows) and rows[i] == row
+        if value_matches(kind, pattern, value) != present:
+            if present:
+                del rows[i]
+            else:
+                rows.insert(i, row)
+
+
+def next_match(rows, row, forward=True):
+    """Nearest position in a sorted position array after (or before) a row, None if there is none"""
+    if forward:
+        i = bisect.bisect_right(rows, row)
+        return rows[i] if i < len(rows) else None
+    i = bisect.bisect_left(rows, row)
+    return rows[i - 1] if i > 0 else None
+
+
+class FrameSource:
+    """Row source backed by a fully loaded pandas DataFrame"""
+
+    fully_indexed = True
+
+    def __init__(self, df):
+        self.df = df
+        self._matches = {}
+
+    @property
+    def columns(self):
+        return self.df.columns.tolist()
+
+    def __len__(self):
+        return len(self.df)
+
+    def has_row(self, row):
+        return row < len(self.df)
+
+    def ensure_column(self, column):
+        if column not in self.df.columns:
+            self.df[column] = ""
+        elif self.df[column].dtype.kind != "O":
+            # An empty or numeric column is read as numbers, which cannot hold text labels
+            self.df[column] = self.df[column].astype(object)
+
+    def get(self, row, column):
+        return self.df[column].iloc[row]
+
+    def set(self, row, column, value):
+        self.df.at[row, column] = value
+        update_matches(self._matches, column, row, value)
+
+    def filled_rows(self, column):
+        """Positions of the rows that have a non-empty value in a column"""
+        filled = self.df[column].fillna("").astype(str) != ""
+        return filled.to_numpy().nonzero()[0].tolist()
+
+    def matching_rows(self, column, kind, pattern=None):
+        """Sorted positions of the rows whose value passes value_matches, cached per query"""
+        key = (column, kind, pattern)
+        if key not in self._matches:
+            values = self.df[column].fillna("").astype(str)
+            if kind == "regex":
+                mask = values.str.contains(pattern, flags=re.IGNORECASE, regex=True)
+            elif kind == "equals":
+                mask = values == pattern
+            else:
+                mask = values == ""
+            rows = array("Q")
+            rows.frombytes(mask.to_numpy().nonzero()[0].astype("uint64").tobytes())
+            self._matches[key] = rows
+        return self._matches[key]
+
+    def next_unfilled(self, column, row):
+        """First row after the given one with an empty value in a column, None if there is none"""
+        return next_match(self.matching_rows(column, "empty"), row)
+
+    def write(self, path):
+        write_frame(self.df, path)
+
+    def close(self):
+        pass
+
+
+class LazyCSVSource:
+    """Row source that keeps only a byte-offset index of the records in memory.
+
+    Record starts are found by scanning the raw bytes for newlines outside of
+    quoted fields, so multi-line text cells are handled. The index is built by a
+    background thread and extended on demand, so the first rows are available
+    right away. Rows are parsed in small read-ahead windows and edits are kept
+    in memory until the file is written with write().
+    """
+
+    _NEWLINE = re.compile(b"\n")
+    _QUOTE_OR_NEWLINE = re.compile(b'["\n]')
+
+    def __init__(self, path, read_ahead=READ_AHEAD_ROWS):
+        self.path = path
+        self.read_ahead = read_ahead
+        self._open()
+
+    def _open(self):
+        self.fully_indexed = False
+
+        self._file = open(self.path, "rb")
+        self._scan_file = open(self.path, "rb")
+        self._scan_pos = 0
+        self._in_quotes = False
+        self._last_byte = b""  # last byte of the previous block, for a '\r' right before it ends
+        self._offsets = array("Q")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._edits = {}
+        self._extra_columns = []
+        self._matches = {}
+
+        # The header is the first record; data records start right after it
+        self._offsets.append(0)
+        while len(self._offsets) < 2 and not self.fully_indexed:
+            self._scan_chunk()
+        header = self._read_records(0, 1)[0] if len(self._offsets) > 1 else []
+        self._columns = header
+        del self._offsets[0]
+
+        self._indexer = threading.Thread(target=self._index_all, daemon=True)
+        self._indexer.start()
+
+    # --- Indexing ---
+
+    def _scan_chunk(self):
+        """Scan the next block of the file and record the record starts found in it"""
+        with self._lock:
+            if self.fully_indexed:
+                return
+            self._scan_file.seek(self._scan_pos)
+            chunk = self._scan_file.read(INDEX_CHUNK_BYTES)
+            if not chunk:
+                # Last record without a trailing newline
+                if self._offsets and self._offsets[-1] < self._scan_pos:
+                    self._offsets.append(self._scan_pos)
+                self.fully_indexed = True
+                return
+
+            offsets = self._offsets
+            base = self._scan_pos
+            if not self._in_quotes and b'"' not in chunk:
+                pattern = self._NEWLINE
+            else:
+                pattern = self._QUOTE_OR_NEWLINE
+            for match in pattern.finditer(chunk):
+                if match.group() == b'"':
+                    self._in_quotes = not self._in_quotes
+                elif not self._in_quotes:
+                    next_start = base + match.start() + 1
+                    # Skip blank lines ('\n' or '\r\n'), like pandas does
+                    length = next_start - offsets[-1]
+                    if length == 2:
+                        # The '\r' may be the last byte of the previous block
+                        blank = (chunk[match.start() - 1:match.start()] if match.start() else self._last_byte) == b"\r"
+                    else:
+                        blank = length <= 1
+                    if blank:
+                        offsets[-1] = next_start
+                    else:
+                        offsets.append(next_start)
+            self._scan_pos = base + len(chunk)
+            self._last_byte = chunk[-1:]
+
+    def _index_all(self):
+        while not self.fully_indexed:
+            self._scan_chunk()
+
+    def _index_until(self, row):
+        """Make sure the end offset of the given row is known, if the row exists"""
+        while len(self._offsets) < row + 2 and not self.fully_indexed:
+            self._scan_chunk()
+
+    # --- Reading ---
+
+    def _read_records(self, first, last):
+        """Parse the records between two positions of the offset index"""
+        start, end = self._offsets[first], self._offsets[last]
+        with self._lock:
+            self._file.seek(start)
+            block = self._file.read(end - start)
+        rows = []
+        for i in range(first, last):
+            raw = block[self._offsets[i] - start:self._offsets[i + 1] - start]
+            text = raw.decode("utf-8-sig" if self._offsets[i] == 0 else "utf-8")
+            rows.append(next(csv.reader(io.StringIO(text)), []))
+        return rows
+
+    def _row(self, row):
+        if row not in self._cache:
+            self._index_until(row + self.read_ahead)
+            last = min(row + self.read_ahead, len(self._offsets) - 1)
+            if row >= last:
+                raise IndexError(f"Row {row} is out of range")
+            for i, values in enumerate(self._read_records(row, last), start=row):
+                self._cache[i] = values
+            while len(self._cache) > 4 * self.read_ahead:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(row)
+        return self._cache[row]
+
+    # --- Row source interface ---
+
+    @property
+    def columns(self):
+        return self._columns + self._extra_columns
+
+    @property
+    def indexed_rows(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def __len__(self):
+        self._indexer.join()
+        return self.indexed_rows
+
+    def has_row(self, row):
+        self._index_until(row)
+        return row < self.indexed_rows
+
+    def ensure_column(self, column):
+        if column not in self.columns:
+            self._extra_columns.append(column)
+
+    def get(self, row, column):
+        edited = self._edits.get(row)
+        if edited and column in edited:
+            return edited[column]
+        if column in self._extra_columns:
+            return ""
+        values = self._row(row)
+        position = self._columns.index(column)
+        return values[position] if position < len(values) else ""
+
+    def set(self, row, column, value):
+        self._edits.setdefault(row, {})[column] = value
+        update_matches(self._matches, column, row, value)
+
+    def filled_rows(self, column):
+        """Positions of the rows that have a non-empty value in a column"""
+        if column in self._extra_columns:
+            return sorted(row for row, edited in self._edits.items() if edited.get(column))
+        return [row for row in range(len(self)) if self.get(row, column)]
+
+    def matching_rows(self, column, kind, pattern=None):
+        """Sorted positions of the rows whose value passes value_matches, cached per query.
+
+        The first query on a column scans the whole file once, block by block.
+        """
+        key = (column, kind, pattern)
+        if key not in self._matches:
+            total = len(self)
+            position = self._columns.index(column) if column in self._columns else None
+            rows = array("Q")
+            for first in range(0, total, 1024):
+                last = min(first + 1024, total)
+                records = self._read_records(first, last) if position is not None else [[]] * (last - first)
+                for row, values in enumerate(records, start=first):
+                    edited = self._edits.get(row)
+                    if edited and column in edited:
+                        value = edited[column]
+                    else:
+                        value = values[position] if position is not None and position < len(values) else ""
+                    if value_matches(kind, pattern, value):
+                        rows.append(row)
+            self._matches[key] = rows
+        return self._matches[key]
+
+    def next_unfilled(self, column, row):
+        """First row after the given one with an empty value in a column, None if there is none"""
+        if column in self._extra_columns:
+            # Only edited rows can have a value, so no scan is needed
+            row += 1
+            while self._edits.get(row, {}).get(column):
+                row += 1
+            return row if self.has_row(row) else None
+        return next_match(self.matching_rows(column, "empty"), row)
+
+    def write(self, path):
+        """Stream all rows with their edits into a CSV file (safe to overwrite the source)"""
+        if file_format(path) != "csv":
+            # Converting to another format needs the whole table
+            pd = import_pandas()
+            df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            for column in self._extra_columns:
+                df[column] = ""
+            for row, edited in self._edits.items():
+                for column, value in edited.items():
+                    df.at[row, column] = value
+            write_frame(df, path)
+            return
+
+        total = len(self)
+        columns = self.columns
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            writer.writerow(columns)
+            for first in range(0, total, 1024):
+                last = min(first + 1024, total)
+                for row, values in enumerate(self._read_records(first, last), start=first):
+                    values = values + [""] * (len(columns) - len(values))
+                    for column, value in self._edits.get(row, {}).items():
+                        values[columns.index(column)] = value
+                    writer.writerow(values)
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            # The edits are now part of the file, so start over on the new contents
+            self.close()
+            os.replace(tmp_path, path)
+            self._open()
+        else:
+            os.replace(tmp_path, path)
+
+    def close(self):
+        self._file.close()
+        with self._lock:
+            self.fully_indexed = True
+            self._scan_file.close()
+
+
+class ProjectedSource(FrameSource):
+    """Row source over a Parquet, Feather or JSONL file that loads only the columns in use.
+
+    Only the schema and row count are read up front; each column is read the
+    first time it is needed, so working on one text column never loads the
+    others. Saving in the same format streams the file batch by batch and swaps
+    in the edited columns, leaving the rest of the file as it was.
+    """
+
+    def __init__(self, path):
+        pd = import_pandas()
+        self.path = path
+        self.format = file_format(path)
+        self._file_columns, rows = self._read_schema()
+        super().__init__(pd.DataFrame(index=pd.RangeIndex(rows)))
+        self._edited = set()
+
+    # --- Reading ---
+
+    def _read_schema(self):
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            metadata = pq.read_metadata(self.path)
+            return metadata.schema.to_arrow_schema().names, metadata.num_rows
+        if self.format == "feather":
+            import pyarrow as pa
+            import pyarrow.feather as feather
+            with pa.memory_map(self.path) as f:
+                names = pa.ipc.open_file(f).schema.names
+            # Selecting no columns reads (and decompresses) nothing, but still gives the row count
+            return names, feather.read_table(self.path, columns=[], memory_map=True).num_rows
+
+        columns, rows = {}, 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    if not rows:
+                        columns = json.loads(line)
+                    rows += 1
+        return list(columns), rows
+
+    def _read_columns(self, columns):
+        pd = import_pandas()
+        if self.format == "parquet":
+            return pd.read_parquet(self.path, columns=columns)
+        if self.format == "feather":
+            return pd.read_feather(self.path, columns=columns)
+        values = {column: [] for column in columns}
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    for column in columns:
+                        values[column].append(record.get(column))
+        return pd.DataFrame(values)
+
+    def load_columns(self, columns):
+        """Read the given file columns into memory, if they are not loaded yet"""
+        missing = [c for c in columns if c in self._file_columns and c not in self.df.columns]
+        if missing:
+            loaded = self._read_columns(missing)
+            for column in missing:
+                self.df[column] = loaded[column].to_numpy()
+
+    # --- Row source interface ---
+
+    @property
+    def columns(self):
+        return self._file_columns + [c for c in self.df.columns if c not in self._file_columns]
+
+    def ensure_column(self, column):
+        self.load_columns([column])
+        super().ensure_column(column)
+
+    def get(self, row, column):
+        self.load_columns([column])
+        return super().get(row, column)
+
+    def set(self, row, column, value):
+        self.ensure_column(column)
+        self._edited.add(column)
+        super().set(row, column, value)
+
+    def filled_rows(self, column):
+        self.load_columns([column])
+        return super().filled_rows(column)
+
+    def matching_rows(self, column, kind, pattern=None):
+        self.load_columns([column])
+        return super().matching_rows(column, kind, pattern)
+
+    # --- Writing ---
+
+    def _merge_batch(self, table, offset, pa):
+        """Replace (or add) the edited columns in a batch of the original file"""
+        for column in self.columns:
+            if column not in self._edited and column in self._file_columns:
+                continue
+            if column not in self.df.columns:
+                continue
+            values = self.df[column].iloc[offset:offset + table.num_rows]
+            position = table.schema.get_field_index(column)
+            # Edited columns hold text (see ensure_column), even where the file stored
+            # numbers or nulls, e.g. an empty label column; the type must match in every batch
+            file_type = table.schema.field(position).type if position >= 0 else None
+            if file_type is not None and (pa.types.is_string(file_type) or pa.types.is_large_string(file_type)):
+                data_type = file_type
+            else:
+                data_type = pa.string()
+            # Rows left as they were may still hold the file's numbers
+            values = values.map(str, na_action="ignore")
+            array_ = pa.array(values.to_numpy(dtype=object), type=data_type, from_pandas=True)
+            if position >= 0:
+                table = table.set_column(position, pa.field(column, data_type), array_)
+            else:
+                table = table.append_column(pa.field(column, data_type), array_)
+        return table
+
+    def write(self, path):
+        """Write all columns with the edits; the same format is streamed, others are converted"""
+        if file_format(path) != self.format:
+            self.load_columns(self._file_columns)
+            write_frame(self.df[self.columns], path)
+            return
+
+        tmp_path = f"{path}.tmp"
+        if self.format == "jsonl":
+            pd = import_pandas()
+            edited = [c for c in self.columns if c in self._edited or c not in self._file_columns]
+            with open(self.path, "rb") as src, open(tmp_path, "w", encoding="utf-8") as out:
+                row = 0
+                for line in src:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    for column in edited:
+                        value = self.df.at[row, column]
+                        record[column] = None if pd.isna(value) else value
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    row += 1
+            os.replace(tmp_path, path)
+            return
+
+        import pyarrow as pa
+        offset = 0
+        writer = None
+        original = None
+        try:
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+                original = pq.ParquetFile(self.path)
+                batches = original.iter_batches(batch_size=WRITE_BATCH_ROWS)
+            else:
+                original = pa.memory_map(self.path)
+                reader = pa.ipc.open_file(original)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            for batch in batches:
+                table = self._merge_batch(pa.Table.from_batches([batch]), offset, pa)
+                offset += table.num_rows
+                if writer is None:
+                    if self.format == "parquet":
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    else:
+                        writer = pa.ipc.new_file(tmp_path, table.schema)
+                writer.write_table(table)
+            if writer is None:
+                # No rows: write the (merged) schema only
+                self.load_columns(self._file_columns)
+                write_frame(self.df[self.columns], tmp_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            # Release the original before it is replaced (Windows keeps open files locked)
+            if original is not None:
+                original.close()
+        os.replace(tmp_path, path)
+
+
+def load_file(path, lazy=False):
+    """Open a data file as a row source.
+
+    Parquet, Feather and JSONL files load only the columns that are used; very
+    large CSV files (or any CSV file with lazy=True) are read lazily.
+    """
+    if file_format(path) != "csv":
+        return ProjectedSource(path)
+    if lazy or os.path.getsize(path) >= LAZY_THRESHOLD_BYTES:
+        print("📚 Rows are read on demand instead of loading the whole file.")
+        return LazyCSVSource(path)
+    return FrameSource(import_pandas().read_csv(path))
+
+
+def total_label(source):
+    """Total row count for progress displays ('1234+' while a lazy file is still being indexed)"""
+    if source.fully_indexed:
+        return str(len(source))
+    return f"{source.indexed_rows}+"
+
+
+# ANNOTATION JOURNAL
+
+# Journal entries are flushed to the OS right away, but only fsynced in batches
+JOURNAL_SYNC_EVERY = 20
+JOURNAL_SYNC_SECONDS = 5.0
+
+
+class AnnotationJournal:
+    """Append-only log of labels and notes, stored next to the data file.
+
+    Every edit is appended as one JSON line (row, column, value, timestamp), so
+    saving a label costs the same no matter how large the file is and a crash
+    loses nothing. The journal is merged into the data file by compact().
+    """
+
+    def __init__(self, data_path):
+        self.path = data_path + ".journal"
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def entries(self, offset=0):
+        """Yield the journaled edits in the order they were made, starting at a byte offset"""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A half-written last line from a crash
+                    continue
 
-# --- Standard Library Imports (Should always work) ---
-import tkinter as tk
-from tkinter import filedialog
+    def replay(self, source):
+        """Apply all journaled edits to a row source and return how many there were"""
+        count = 0
+        for entry in self.entries():
+            source.ensure_column(entry["column"])
+            source.set(entry["row"], entry["column"], entry["value"])
+            count += 1
+        return count
 
-# All required tools are now loaded: tk, filedialog, pd, os, random
-print("All required packages are loaded and ready.")
-# You can now proceed with the rest of your program
+    def record(self, row, column, value):
+        entry = {
+            "row": int(row),
+            "column": column,
+            "value": value,
+            "timestamp": datetime.now().isoformat(),
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if (self._pending >= JOURNAL_SYNC_EVERY
+                or time.monotonic() - self._last_sync >= JOURNAL_SYNC_SECONDS):
+            self.sync()
+
+    def size(self):
+        """Current length of the journal in bytes"""
+        self._file.flush()
+        return os.path.getsize(self.path)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self, source, output_path):
+        """Write the source (which already holds all edits) to a file and empty the journal"""
+        self.sync()
+        source.write(output_path)
+        self._file.close()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self.sync()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+        if os.path.getsize(self.path) == 0:
+            os.remove(self.path)
+
+
+def open_with_journal(path, lazy=False):
+    """Load a file and replay any edits left in its journal by an earlier session"""
+    source = load_file(path, lazy)
+    journal = AnnotationJournal(path)
+    recovered = journal.replay(source)
+    if recovered:
+        print(f"♻️ Recovered {recovered} unsaved edits from '{journal.path}'.")
+    return source, journal
+
+
+# ANNOTATION SESSIONS
+
+class SeededPermutation:
+    """Shuffled order of range(size) that is computed per position instead of stored.
+
+    A small Feistel network permutes the smallest even-bit domain that holds all
+    positions; values outside range(size) are encrypted again until they fall
+    inside (cycle walking), which keeps the mapping a permutation.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size, seed):
+        self.size = size
+        self._half_bits = max(1, ((max(size, 2) - 1).bit_length() + 1) // 2)
+        self._mask = (1 << self._half_bits) - 1
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def _round(self, value, key):
+        value = ((value ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+        value ^= value >> 16
+        return value & self._mask
+
+    def _encrypt(self, value):
+        left, right = value >> self._half_bits, value & self._mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self._half_bits) | right
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError(f"Position {position} is out of range")
+        value = self._encrypt(position)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+class AnnotationSession:
+    """Saved progress of annotate mode, stored next to the data file.
+
+    Only the seed of the shuffled order, the cursor and a bitmap of labelled rows
+    are kept. On restart the bitmap is brought up to date from the part of the
+    journal written after the last save, so annotation continues at the next
+    unlabelled row without reading the user_label column again. The row count is
+    saved too, so a lazy file is not scanned to the end while it is unchanged.
+
+    The first session for a file, and any session whose file was written since
+    (e.g. by browse mode or --compact, which fold the journal into it), has to
+    read the whole user_label column (for a lazy file, one full scan) to take
+    over the labels that are in it.
+    """
+
+    def __init__(self, data_path, size, seed=None):
+        self.data_path = data_path
+        self.path = data_path + ".session.json"
+        self.size = size
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.order = SeededPermutation(size, self.seed)
+        self.cursor = 0
+        self.labelled = bytearray((size + 7) // 8)
+        self.labelled_count = 0
+        self._unsaved = 0
+
+    @staticmethod
+    def file_stamp(path):
+        """Size and modification time of the data file, to tell whether it changed since a save"""
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @classmethod
+    def resume(cls, data_path, source, journal):
+        """Continue the saved session of a file, or start a new one"""
+        state = None
+        try:
+            with open(data_path + ".session.json", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        unchanged = bool(state) and state.get("file") == cls.file_stamp(data_path)
+        if unchanged:
+            size = state["size"]
+        else:
+            if not source.fully_indexed:
+                print("🔍 Reading the file once to count its rows and find existing labels...")
+            size = len(source)
+
+        resumed = bool(state) and state.get("size") == size
+        session = cls(data_path, size, state["seed"] if resumed else None)
+        if resumed:
+            session.cursor = state["cursor"]
+        if unchanged:
+            session.labelled = bytearray(zlib.decompress(base64.b64decode(state["labelled"])))
+            session.labelled_count = state["labelled_count"]
+            journal_offset = state["journal_offset"]
+        else:
+            # New session, or the file was written since the last save (its journal
+            # may have been folded in and truncated): take over the labels in it
+            for row in source.filled_rows("user_label"):
+                session.mark(row)
+            journal_offset = 0
+
+        for entry in journal.entries(journal_offset):
+            if entry["column"] == "user_label" and entry["value"]:
+                session.mark(entry["row"])
+
+        if session.cursor >= size and session.labelled_count < size:
+            # The last pass ended with skipped entries, so go over them again
+            session.cursor = 0
+        session.advance()
+        if resumed:
+            print(f"♻️ Resuming annotation: {session.labelled_count}/{size} entries already labelled.")
+        else:
+            # Keep the shuffled order even if the program stops before the next save
+            session.save(journal)
+        return session
+
+    def is_labelled(self, row):
+        return bool(self.labelled[row >> 3] & (1 << (row & 7)))
+
+    def mark(self, row):
+        if not self.is_labelled(row):
+            self.labelled[row >> 3] |= 1 << (row & 7)
+            self.labelled_count += 1
+
+    @property
+    def current_row(self):
+        return self.order[self.cursor]
+
+    def advance(self):
+        """Move the cursor forward to the next unlabelled row"""
+        while self.cursor < self.size and self.is_labelled(self.order[self.cursor]):
+            self.cursor += 1
+
+    def label(self, row, journal):
+        """Mark a row as labelled and save the session every few labels"""
+        self.mark(row)
+        self._unsaved += 1
+        if self._unsaved >= JOURNAL_SYNC_EVERY:
+            self.save(journal)
+
+    def save(self, journal):
+        state = {
+            "file": self.file_stamp(self.data_path),
+            "size": self.size,
+            "seed": self.seed,
+            "cursor": self.cursor,
+            "labelled_count": self.labelled_count,
+            "labelled": base64.b64encode(zlib.compress(bytes(self.labelled))).decode("ascii"),
+            "journal_offset": journal.size(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# KEYBOARD INPUT
+
+# Escape sequences sent by the arrow keys (POSIX terminals, then the Windows console)
+ANSI_KEYS = {"\x1b[A": "up", "\x1b[B": "down", "\x1b[C": "right", "\x1b[D": "left",
+             "\x1bOA": "up", "\x1bOB": "down", "\x1bOC": "right", "\x1bOD": "left"}
+WINDOWS_KEYS = {"H": "up", "P": "down", "M": "right", "K": "left"}
+
+
+def single_key_mode():
+    """Keystrokes can be read one at a time only from an interactive terminal"""
+    return sys.stdin.isatty() and sys.stdout.isatty()
+
+
+def read_key():
+    """Wait for one keypress and return it, with 'enter', 'backspace' and arrows named"""
+    if os.name == "nt":
+        import msvcrt
+        key = msvcrt.getwch()
+        if key in ("\x00", "\xe0"):
+            return WINDOWS_KEYS.get(msvcrt.getwch(), "")
+    else:
+        import termios
+        import tty
+        fd = sys.stdin.fileno()
+        saved = termios.tcgetattr(fd)
+        try:
+            # cbreak only while waiting, so text prompts and crashes leave a normal terminal
+            tty.setcbreak(fd)
+            # A keypress, escape sequence included, arrives in one read
+            key = os.read(fd, 8).decode("utf-8", errors="ignore")
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        if key.startswith("\x1b"):
+            return ANSI_KEYS.get(key, "esc")
+        key = key[:1]
+
+    if key in ("\r", "\n"):
+        return "enter"
+    if key in ("\x7f", "\x08"):
+        return "backspace"
+    if key == "\x03":
+        raise KeyboardInterrupt
+    return key.lower()
+
+
+def read_command(keymap, label_keys=()):
+    """Read a keypress and translate it into the command that would be typed in line mode.
+
+    Digits build up a label key; they are taken as soon as no longer label key
+    starts with them (so 1-9 need one keystroke), otherwise Enter confirms.
+    """
+    typed = ""
+    while True:
+        key = read_key()
+        if key.isdigit():
+            typed += key
+            if typed in label_keys and not any(k.startswith(typed) and k != typed for k in label_keys):
+                return typed
+            print(key, end="", flush=True)
+        elif key == "backspace" and typed:
+            typed = typed[:-1]
+            print("\b \b", end="", flush=True)
+        elif typed:
+            if key == "enter":
+                return typed
+        else:
+            return keymap.get(key, key)
+
+
+def enable_ansi():
+    """Let the Windows console interpret ANSI escape codes (other terminals already do)"""
+    if os.name != "nt":
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        pass
 
 
 ##############################################################################################################################################################################
@@ -38,81 +964,82 @@ print("All required packages are loaded and ready.")
 # COMMENCE PROGRAM
 
 def clear_screen():
-    # For Windows
-    if os.name == "nt":
-        os.system("cls")
-    # For macOS/Linux
-    else:
-        os.system("clear")
+    # Cursor home + clear screen, written directly instead of spawning cls/clear
+    sys.stdout.write("\033[H\033[2J")
+    sys.stdout.flush()
 
 
-# Welcome message
-print("Welcome to SpeechClicker! Press Enter to Start.\n")
-input()
+# Keys and the line-mode commands they stand for
+ANNOTATE_KEYS = {"enter": "", "right": "", "left": "back", "b": "back",
+                 "s": "save", "o": "new", "q": "exit"}
+BROWSE_KEYS = {"enter": "", "right": "", " ": "", "left": "back", "b": "back",
+               "c": "check", "n": "note", "s": "save", "o": "new", "q": "exit",
+               "g": "goto", "/": "find", "f": "filter", "u": "next-unnoted", "x": "clear"}
 
 
-# Open a file dialog to select a csv file
-root = tk.Tk()
-root.withdraw()  # Hide the root window
-file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+def choose_file():
+    """Pick a data file in a Tk dialog, or type its path when Tk or a display is not available"""
+    try:
+        import tkinter as tk
+        from tkinter import filedialog
+        root = tk.Tk()
+    except Exception:
+        return input("Path to the data file: ").strip()
+    root.withdraw()  # Hide the root window
+    file_path = filedialog.askopenfilename(filetypes=FILE_TYPES)
+    root.destroy()
+    return file_path
 
-#file_path = input("Please enter the path to the CSV file: ")
 
-try:
-    df = pd.read_csv(file_path)
+def open_file(file_path, lazy=False):
+    try:
+        source, journal = open_with_journal(file_path, lazy)
+    except FileNotFoundError:
+        print("❌ The file was not found. Please check the path and try again.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ An error occurred while opening the file: {e}")
+        print("Please check the file format and try again.")
+        sys.exit(1)
     print("✅ File loaded successfully!\n")
-except FileNotFoundError:
-    print("❌ The file was not found. Please check the path and try again.")
-    exit()
-except Exception as e:
-    print(f"❌ An error occurred while opening the file: {e}")
-    print("Please check the file format and try again.")
-
-# Step 2: Show available columns
-print("Available columns:")
-print(df.columns.tolist())
-
-# Step 3: Ask for column name repeatedly until a valid one is entered
-while True:
-    column_name = input("\nWhich column do you want to investigate? ")
-
-    # Check if the column name exists in the DataFrame's columns
-    if column_name in df.columns:
-        # If valid, break the loop and continue with the rest of the program
-        print(f"✅ Column '{column_name}' selected for investigation.")
-        break
-    else:
-        # If invalid, print an error and the loop will restart
-        print(f"❌ Column '{column_name}' does not exist in this file.")
-        print("Please check the column name and try again.")
-        # The loop simply restarts, prompting the user again
+    return source, journal
 
 
+def ask_column(source, column_name=None):
+    """Return the column to investigate, asking until an existing one is entered"""
+    # Step 2: Show available columns
+    if column_name not in source.columns:
+        print("Available columns:")
+        print(source.columns)
 
-# Let the user choose between "browsing mode" and "annotation mode"
-while True:
-    mode = input("\nChoose mode: \n"
-             "'browse' to explore data and leave notes, \n"  
-             "'annotate' to assign labels for future ML applications. ")
-    
-    if mode in ['browse', 'annotate']:
-        break
+    # Step 3: Ask for column name repeatedly until a valid one is entered
+    while True:
+        if column_name is None:
+            column_name = input("\nWhich column do you want to investigate? ")
+
+        # Check if the column name exists in the DataFrame's columns
+        if column_name in source.columns:
+            print(f"✅ Column '{column_name}' selected for investigation.")
+            return column_name
+
+        print(f"❌ Column '{column_name}' does not exist in this file.")
+        print("Please check the column name and try again.")
+        column_name = None
 
-    else:
-        print("❌ Invalid mode selected.")
 
 # --- Annotation Mode Implementation ---
-if mode == 'annotate':
+def annotate(file_path, source, journal, column_name, labels=None, output=None, lazy=False, single_key=False):
     clear_screen()
     print("--- Annotation Mode Selected ---")
     
-    # 1. Get user-defined labels
-    labels_input = input("Enter labels separated by a comma (e.g., 'positive,negative,neutral'): ")
-    labels = [label.strip() for label in labels_input.split(',') if label.strip()]
+    # 1. Get user-defined labels (unless they were given on the command line)
+    if labels is None:
+        labels_input = input("Enter labels separated by a comma (e.g., 'positive,negative,neutral'): ")
+        labels = [label.strip() for label in labels_input.split(',') if label.strip()]
     
     if not labels:
         print("❌ No valid labels entered. The program will exit.")
-        exit()
+        sys.exit()
 
     # Create key-to-label map and instructions
     label_map = {str(i + 1): label for i, label in enumerate(labels)}
@@ -121,57 +1048,72 @@ if mode == 'annotate':
     ]
     
     # Ensure "user_label" column exists
-    if "user_label" not in df.columns:
-        df["user_label"] = ""
+    source.ensure_column("user_label")
     
-    # Prepare a list of indices to iterate through (randomized)
-    available_indices = list(range(len(df)))
-    random.shuffle(available_indices)
-    
-    current_index_pos = 0 # Position in the available_indices list
+    # Continue the saved session (randomized order) or start a new one
+    session = AnnotationSession.resume(file_path, source, journal)
 
     print("\nStarting annotation...")
+    status = ""
     
-    while current_index_pos < len(available_indices):
+    while session.cursor < session.size:
         
-        # Get the actual index in the DataFrame from the shuffled list
-        df_index = available_indices[current_index_pos] 
+        # Get the actual index in the DataFrame from the shuffled order
+        df_index = session.current_row
         
         clear_screen()
         
         print("--- Annotation Mode ---")
-        print(f"[{current_index_pos+1}/{len(available_indices)}] Current Entry:")
-        print(f"  > {df[column_name].iloc[df_index]}")
+        print(f"[{session.cursor+1}/{session.size}] Current Entry "
+              f"({session.labelled_count} labelled so far):")
+        print(f"  > {source.get(df_index, column_name)}")
         
         # Show existing annotation if any
-        current_annotation = df["user_label"].iloc[df_index]
+        current_annotation = source.get(df_index, "user_label")
         if current_annotation:
             print(f"🏷️ Existing annotation: {current_annotation}")
             
         print("\nAnnotation Options:")
         print('\n'.join(annotation_instructions))
+
+        # Outcome of the previous action, shown here instead of pausing for Enter
+        if status:
+            print(f"\n{status}")
+            status = ""
         
-        user_input = input(
-            "\n"
-            "Input a number to annotate, **press Enter to skip**, type 'back' for previous, "
-            "type 'exit' to save and quit, or 'new' to load a new file.\n"
-        ).lower()
+        if single_key:
+            print("\n[number] annotate  [Enter/→] skip  [←/b] back  [s] save  [o] open another file  [q] quit")
+            user_input = read_command(ANNOTATE_KEYS, label_map)
+        else:
+            user_input = input(
+                "\n"
+                "Input a number to annotate, **press Enter to skip**, type 'back' for previous, "
+                "'save' to write your annotations into the file, "
+                "type 'exit' to save and quit, or 'new' to load a new file.\n"
+            ).lower()
         
         # --- Handle User Input ---
         
         if user_input.lower() == "exit":
                     # Determine the default 'edited' file path
-                    edited_path = file_path.replace(".csv", "_edited.csv")
+                    file_base, file_ext = os.path.splitext(file_path)
+                    edited_path = f"{file_base}_edited{file_ext}"
                     
-                    print(f"\n\nYou are about to save your annotations.")
-                    print(f"Option 1: Overwrite original file (by typing 'yes').")
-                    print(f"Option 2: Save as new file (e.g., '{edited_path}').")
+                    if output:
+                        # Given on the command line
+                        confirm = output
+                    else:
+                        print(f"\n\nYou are about to save your annotations.")
+                        print(f"Option 1: Overwrite original file (by typing 'yes').")
+                        print(f"Option 2: Save as new file (e.g., '{edited_path}').")
 
-                    confirm = input("\nType 'yes' to overwrite, or enter a new file name: ")
+                        confirm = input("\nType 'yes' to overwrite, or enter a new file name: ")
                     
                     if confirm.lower() == "yes":
                         # User chose to OVERWRITE the original file
-                        df.to_csv(file_path, index=False)
+                        journal.compact(source, file_path)
+                        session.save(journal)
+                        journal.close()
                         print(f"👋 Exiting the program. Your notes are saved and **overwrote** '{file_path}'. Goodbye :)")
                     
                     else:
@@ -180,44 +1122,29 @@ if mode == 'annotate':
                         # 1. Determine the base path: use user's input or the 'edited' path if input is empty
                         base_path = confirm if confirm.strip() else edited_path
                         
-                        # 2. Ensure the path ends with '.csv'
-                        if not base_path.lower().endswith(".csv"):
-                            output_path = base_path + ".csv"
-                        else:
-                            output_path = base_path
+                        # 2. Keep a supported extension (.csv, .parquet, .feather, .jsonl), else use the original one
+                        output_path = with_data_extension(base_path, file_ext)
                         
                         # Save to the determined output path
-                        df.to_csv(output_path, index=False)
+                        journal.compact(source, output_path)
+                        # The labels now live in the new file, so the original starts over
+                        session.discard()
+                        journal.close()
                         print(f"👋 Exiting the program. Your notes are saved to '{output_path}'. Goodbye :)")
                     
                     break
         
         elif user_input == "new":
-            input("Press Enter to save current annotations and load a new CSV file.")
-            df.to_csv(file_path, index=False)
+            print("\n📂 Choose a new data file (your annotations stay in the journal until you 'save').")
+            session.save(journal)
+            journal.close()
+            source.close()
             
-            # Open a file dialog to select a new csv file
-            root = tk.Tk()
-            root.withdraw()  # Hide the root window
-            file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-
-            try:
-                df = pd.read_csv(file_path)
-                print("✅ New file loaded successfully!\n")
-            except FileNotFoundError:
-                print("❌ The file was not found. Please check the path and try again.")
-                exit()
-            except Exception as e:
-                print(f"❌ An error occurred while opening the file: {e}")
-                exit()
-
-            # Re-initialize for new file
-            print("Available columns:")
-            print(df.columns.tolist())
-            column_name = input("\nWhich column do you want to investigate? ")
+            file_path = choose_file()
+            source, journal = open_file(file_path, lazy)
+            column_name = ask_column(source)
 
-            if "user_label" not in df.columns:
-                df["user_label"] = ""
+            source.ensure_column("user_label")
             
             # Re-run the annotation setup to get new labels if needed
             print("\n--- Annotation Mode Reloaded ---")
@@ -226,100 +1153,193 @@ if mode == 'annotate':
             
             if not labels:
                 print("❌ No valid labels entered. Exiting.")
-                exit()
+                sys.exit()
             
             label_map = {str(i + 1): label for i, label in enumerate(labels)}
             annotation_instructions = [
                 f"  - Press '{key}' for '{label}'" for key, label in label_map.items()
             ]
             
-            available_indices = list(range(len(df)))
-            random.shuffle(available_indices)
-            current_index_pos = 0
+            session = AnnotationSession.resume(file_path, source, journal)
             
             continue # Skip to the start of the new file's annotation loop
 
+        elif user_input == "save":
+            journal.compact(source, file_path)
+            session.save(journal)
+            status = f"💾 Annotations written to '{file_path}'."
+            continue
+
         elif user_input == "back":
-            current_index_pos -= 1
-            if current_index_pos < 0:
-                current_index_pos = 0 # Stay at the beginning
+            session.cursor -= 1
+            if session.cursor < 0:
+                session.cursor = 0 # Stay at the beginning
             continue # Go to next loop iteration
         
         # Correctly handles the Skip (Enter key)
         elif not user_input:
-            print("⏭️ Skipping entry.")
-            input("Press Enter to continue...")
-            current_index_pos += 1 # Move to the next entry
+            status = "⏭️ Skipped entry."
+            session.cursor += 1 # Move to the next entry
+            session.advance()
             
         # Check if the input is one of the valid annotation keys
         elif user_input in label_map:
             label = label_map[user_input]
-            df.at[df_index, "user_label"] = label
-            print(f"✅ Annotated as: {label}")
-            input("Press Enter to continue...")
-            current_index_pos += 1
+            source.set(df_index, "user_label", label)
+            journal.record(df_index, "user_label", label)
+            session.label(df_index, journal)
+            status = f"✅ Annotated as: {label}"
+            session.cursor += 1
+            session.advance()
             
         else:
-            print("❌ Invalid input. Please try again.")
-            input("Press Enter to continue...")
-            # Do not increment current_index_pos, stay on the current item
+            status = "❌ Invalid input. Please try again."
+            # Do not move the cursor, stay on the current item
             continue
             
     else:
         # Loop finished
-        df.to_csv(file_path, index=False)
+        if output:
+            journal.compact(source, with_data_extension(output, os.path.splitext(file_path)[1]))
+            session.discard()
+        else:
+            journal.compact(source, file_path)
+            session.save(journal)
+        journal.close()
         print("\n\n\n\n✅ End of all entries reached. All annotations are saved. Goodbye :)")
 
 
+
 # ----------------------------------------------------------------------
 
 # --- Browsing Mode Implementation ---
-elif mode == 'browse':
+def browse(file_path, source, journal, column_name, output=None, lazy=False, single_key=False):
     # Step 4: Iterate through entries
     print(f"\nExploring column: {column_name}\n")
     index = 0
 
     # Ensure "user_notes" column exists before loop starts
-    if "user_notes" not in df.columns:
-        df["user_notes"] = ""
+    source.ensure_column("user_notes")
+    status = ""
+    # Row positions of the active 'find' or 'filter'; Enter and 'back' then move between them
+    matches = None
+    match_label = ""
 
-    while index < len(df):
+    while source.has_row(index):
         clear_screen()  # ✅ this clears the screen each time
         print("--- Browsing Mode ---")
-        print(f"[{index+1}/{len(df)}] {df[column_name].iloc[index]}")
+        if matches is not None:
+            at = bisect.bisect_left(matches, index)
+            position = f"{at + 1}" if at < len(matches) and matches[at] == index else "-"
+            print(f"🔎 {match_label}: match {position}/{len(matches)} ('clear' to show all rows)")
+        print(f"[{index+1}/{total_label(source)}] {source.get(index, column_name)}")
         
         # Show existing note if any
-        current_note = df["user_notes"].iloc[index]
+        current_note = source.get(index, "user_notes")
         if current_note:
             print(f"📝 Existing note: {current_note}")
+
+        # Outcome of the previous action, shown here instead of pausing for Enter
+        if status:
+            print(f"\n{status}")
+            status = ""
         
-        # Cleaned up prompt to be more concise
-        user_input = input(
-            "\n"
-            "\n"
-            "You have the following options: \n"
-            "\n"
-            "Press Enter for next entry, \n"
-            "Type 'back' for previous entry, \n"
-            "Type 'check' to view another column in the same row, \n"
-            "Type 'new' to input a new CSV file, \n"
-            "Type 'note' to add a note, \n"
-            "Type 'exit' to save all notes and quit.\n" 
-        )
+        if single_key:
+            print("\n[Enter/→] next  [←/b] back  [c] check column  [n] note  "
+                  "[s] save  [o] open another file  [q] quit")
+            print("[g] go to row  [/] find  [f] filter  [u] next unnoted  [x] clear find/filter")
+            user_input = read_command(BROWSE_KEYS)
+        else:
+            # Cleaned up prompt to be more concise
+            user_input = input(
+                "\n"
+                "\n"
+                "You have the following options: \n"
+                "\n"
+                "Press Enter for next entry, \n"
+                "Type 'back' for previous entry, \n"
+                "Type 'goto N' to jump to row N, \n"
+                "Type 'find <regex>' to step through rows matching a pattern, \n"
+                "Type 'filter <column>=<value>' to step through rows with that value, \n"
+                "Type 'clear' to show all rows again, \n"
+                "Type 'next-unnoted' to jump to the next row without a note, \n"
+                "Type 'check' to view another column in the same row, \n"
+                "Type 'new' to input a new data file, \n"
+                "Type 'note' to add a note, \n"
+                "Type 'save' to write your notes into the file, \n"
+                "Type 'exit' to save all notes and quit.\n" 
+            )
+
+        # Navigation commands take an argument ('goto 12'); it is asked for when missing
+        command, _, argument = user_input.strip().partition(" ")
+        command = command.lower()
+        argument = argument.strip()
+        if command in ("goto", "find", "filter") and not argument:
+            prompts = {"goto": "Row number: ", "find": "Pattern (regex): ", "filter": "Filter (column=value): "}
+            argument = input(f"\n{prompts[command]}").strip()
         
-        if user_input.lower() == "exit":
+        if command == "goto":
+            if argument.isdigit() and int(argument) >= 1 and source.has_row(int(argument) - 1):
+                index = int(argument) - 1
+            else:
+                status = f"❌ There is no row '{argument}'."
+
+        elif command in ("find", "filter"):
+            if command == "find":
+                query = (column_name, "regex", argument)
+                label = f"find '{argument}'"
+            else:
+                filter_column, _, value = argument.partition("=")
+                query = (filter_column.strip(), "equals", value.strip())
+                label = f"filter {filter_column.strip()}={value.strip()}"
+            if query[0] not in source.columns:
+                status = f"❌ Column '{query[0]}' does not exist."
+            else:
+                if not source.fully_indexed:
+                    print("🔎 Searching the whole file...")
+                try:
+                    found = source.matching_rows(*query)
+                except re.error as e:
+                    status = f"❌ Invalid pattern: {e}"
+                else:
+                    if not found:
+                        status = f"❌ No rows match {label}."
+                    else:
+                        matches, match_label = found, label
+                        # Stay on the current row if it matches, otherwise go to the next match
+                        at = bisect.bisect_left(matches, index)
+                        index = matches[at] if at < len(matches) else matches[0]
+
+        elif command == "clear":
+            matches = None
+            status = "Showing all rows."
+
+        elif command == "next-unnoted":
+            unnoted = source.next_unfilled("user_notes", index)
+            if unnoted is None:
+                status = "✅ Every row after this one has a note."
+            else:
+                index = unnoted
+
+        elif user_input.lower() == "exit":
                     # Determine the default 'edited' file path
-                    edited_path = file_path.replace(".csv", "_edited.csv")
+                    file_base, file_ext = os.path.splitext(file_path)
+                    edited_path = f"{file_base}_edited{file_ext}"
                     
-                    print(f"\n\nYou are about to save your work.")
-                    print(f"Option 1: Overwrite original file (by typing 'yes').")
-                    print(f"Option 2: Save as new file (e.g., '{edited_path}').")
+                    if output:
+                        # Given on the command line
+                        confirm = output
+                    else:
+                        print(f"\n\nYou are about to save your work.")
+                        print(f"Option 1: Overwrite original file (by typing 'yes').")
+                        print(f"Option 2: Save as new file (e.g., '{edited_path}').")
 
-                    confirm = input("\nType 'yes' to overwrite, or enter a new file name: ")
+                        confirm = input("\nType 'yes' to overwrite, or enter a new file name: ")
                     
                     if confirm.lower() == "yes":
                         # User chose to OVERWRITE the original file
-                        df.to_csv(file_path, index=False)
+                        journal.compact(source, file_path)
+                        journal.close()
                         print(f"👋 Exiting the program. Your notes are saved and **overwrote** '{file_path}'. Goodbye :)")
                     
                     else:
@@ -328,75 +1348,150 @@ elif mode == 'browse':
                         # 1. Determine the base path: use user's input or the 'edited' path if input is empty
                         base_path = confirm if confirm.strip() else edited_path
                         
-                        # 2. Ensure the path ends with '.csv'
-                        if not base_path.lower().endswith(".csv"):
-                            output_path = base_path + ".csv"
-                        else:
-                            output_path = base_path
+                        # 2. Keep a supported extension (.csv, .parquet, .feather, .jsonl), else use the original one
+                        output_path = with_data_extension(base_path, file_ext)
                         
                         # Save to the determined output path
-                        df.to_csv(output_path, index=False)
+                        journal.compact(source, output_path)
+                        journal.close()
                         print(f"👋 Exiting the program. Your notes are saved to '{output_path}'. Goodbye :)")
                     
                     break
         
+        elif user_input.lower() == "save":
+            journal.compact(source, file_path)
+            status = f"💾 Notes written to '{file_path}'."
+
         elif user_input.lower() == "back":
-            index -= 1
-            if index < 0:
-                index = 0
+            if matches is not None:
+                previous = next_match(matches, index, forward=False)
+                if previous is None:
+                    status = "⏮️ This is the first match."
+                else:
+                    index = previous
+            else:
+                index -= 1
+                if index < 0:
+                    index = 0
         
         elif user_input.lower() == "new":
-            input("Press Enter to save current notes and load a new CSV file.")
-            df.to_csv(file_path, index=False)
+            print("\n📂 Choose a new data file (your notes stay in the journal until you 'save').")
+            journal.close()
+            source.close()
             
-            # Open a file dialog to select a new csv file
-            root = tk.Tk()
-            root.withdraw()  # Hide the root window
-            file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-
-            try:
-                df = pd.read_csv(file_path)
-                print("✅ New file loaded successfully!\n")
-            except FileNotFoundError:
-                print("❌ The file was not found. Please check the path and try again.")
-                exit()
-            except Exception as e:
-                print(f"❌ An error occurred while opening the file: {e}")
-                exit()
-
-            # Step 2: Show available columns
-            print("Available columns:")
-            print(df.columns.tolist())
-            
-            # Step 3: Ask for column name
-            column_name = input("\nWhich column do you want to investigate? ")
+            file_path = choose_file()
+            source, journal = open_file(file_path, lazy)
+            column_name = ask_column(source)
 
-            if "user_notes" not in df.columns:
-                df["user_notes"] = ""
+            source.ensure_column("user_notes")
             index = 0
+            matches = None
         
         elif user_input.lower() == "note":
-            note = input("🗒️ What note would you like to add? ")
-            df.at[index, "user_notes"] = note
-            print("✅ Note added.")
-            input("Press Enter to continue...")
-            index += 1
+            note = input("\n🗒️ What note would you like to add? ")
+            source.set(index, "user_notes", note)
+            journal.record(index, "user_notes", note)
+            status = "✅ Note added."
+            if matches is not None:
+                following = next_match(matches, index)
+                if following is None:
+                    status += " That was the last match."
+                else:
+                    index = following
+            else:
+                index += 1
         
         elif user_input.lower() == "check":
             # Display all columns
             print("\nAvailable columns:")
-            print(df.columns.tolist())
+            print(source.columns)
             context_column = input("Enter the name of the column you want to check: ")
-            if context_column in df.columns:
-                print("\n\n")
-                print(f"Context from column '{context_column}': {df[context_column].iloc[index]}")
-                input("Press Enter to continue...")
+            if context_column in source.columns:
+                status = f"Context from column '{context_column}': {source.get(index, context_column)}"
             else:
-                print(f"❌ Column '{context_column}' does not exist.")
+                status = f"❌ Column '{context_column}' does not exist."
 
         # Handles empty input (Enter) and any other non-command input as next
+        elif matches is not None:
+            following = next_match(matches, index)
+            if following is None:
+                status = "⏭️ This is the last match ('clear' to show all rows)."
+            else:
+                index = following
         else:
             index += 1
     else:
-        df.to_csv(file_path, index=False)
-        print("\n\n\n\n✅ End of column reached. All notes are saved. Goodbye :)")
\ No newline at end of file
+        journal.compact(source, with_data_extension(output, os.path.splitext(file_path)[1]) if output else file_path)
+        journal.close()
+        print("\n\n\n\n✅ End of column reached. All notes are saved. Goodbye :)")
+
+
+# ----------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Browse a text column and leave notes, or annotate it with labels. "
+                    "Anything not given on the command line is asked for."
+    )
+    parser.add_argument("file", nargs="?",
+                        help="CSV, Parquet, Feather or JSONL file (a file dialog opens if omitted)")
+    parser.add_argument("-c", "--column", help="column to investigate")
+    parser.add_argument("-m", "--mode", choices=["browse", "annotate"])
+    parser.add_argument("-l", "--labels", help="comma-separated labels for annotate mode, e.g. 'pos,neg'")
+    parser.add_argument("-o", "--output",
+                        help="save here when quitting or finishing, instead of asking")
+    parser.add_argument("--lazy", action="store_true",
+                        help="read a CSV file row by row on demand, whatever its size")
+    parser.add_argument("--line-mode", action="store_true",
+                        help="type commands and press Enter, even in an interactive terminal")
+    parser.add_argument("--compact", action="store_true",
+                        help="write unsaved edits from the file's journal into it (or into --output) and quit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    enable_ansi()
+
+    file_path = args.file
+    if file_path is None:
+        # Welcome message
+        print("Welcome to SpeechClicker! Press Enter to Start.\n")
+        input()
+        file_path = choose_file()
+
+    source, journal = open_file(file_path, args.lazy)
+
+    if args.compact:
+        output_path = with_data_extension(args.output, os.path.splitext(file_path)[1]) if args.output else file_path
+        journal.compact(source, output_path)
+        journal.close()
+        source.close()
+        print(f"💾 Saved to '{output_path}'.")
+        return
+
+    column_name = ask_column(source, args.column)
+
+    # Let the user choose between "browsing mode" and "annotation mode"
+    mode = args.mode
+    while mode not in ['browse', 'annotate']:
+        mode = input("\nChoose mode: \n"
+                 "'browse' to explore data and leave notes, \n"  
+                 "'annotate' to assign labels for future ML applications. ")
+        if mode not in ['browse', 'annotate']:
+            print("❌ Invalid mode selected.")
+
+    # Read single keystrokes when running in a terminal, typed lines otherwise (e.g. piped input)
+    single_key = single_key_mode() and not args.line_mode
+
+    if mode == 'annotate':
+        labels = None
+        if args.labels is not None:
+            labels = [label.strip() for label in args.labels.split(',') if label.strip()]
+        annotate(file_path, source, journal, column_name, labels, args.output, args.lazy, single_key)
+    else:
+        browse(file_path, source, journal, column_name, args.output, args.lazy, single_key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Agreement, label distributions and completion for the database written by sample_coding.py.
+
+AnnotationStats keeps the latest value of every (entry, variable, coder) in
+memory and only reads the rows saved since its last refresh, so the numbers
+stay quick to update on databases with hundreds of thousands of annotations.
+The timestamp indexes this relies on are created by sample_coding.py along
+with the tables; the analytics only ever read the database.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Rows are re-read from this long before the newest timestamp seen, because a
+# save stamped earlier can be committed later (e.g. by another coder's app)
+REREAD_SECONDS = 10
+
+# Columns of the wide table that are not variables
+WIDE_META_COLUMNS = {"id", "text", "timestamp", "coder", "version"}
+
+# Columns held as categoricals in memory
+CATEGORY_COLUMNS = ["entry_id", "variable", "coder", "value"]
+
+# One value is held per (entry, variable, coder)
+KEY_COLUMNS = ["entry_id", "variable", "coder"]
+
+
+# --------------------------
+# Agreement measures
+# --------------------------
+
+def cohens_kappa(first, second):
+    """Cohen's kappa of two coders' labels for the same units (NaN when undefined)"""
+    first, second = np.asarray(first), np.asarray(second)
+    if len(first) == 0:
+        return np.nan
+    codes, categories = pd.factorize(np.concatenate([first, second]))
+    a, b = codes[:len(first)], codes[len(first):]
+    confusion = np.zeros((len(categories), len(categories)))
+    np.add.at(confusion, (a, b), 1)
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = (confusion.sum(axis=1) @ confusion.sum(axis=0)) / total ** 2
+    if expected == 1:
+        return 1.0 if observed == 1 else np.nan
+    return (observed - expected) / (1 - expected)
+
+
+def krippendorff_alpha(units, values):
+    """Krippendorff's alpha for nominal data, from one (unit, value) pair per coder and unit.
+
+    Works for any number of coders and missing values; units coded only once
+    are not pairable and are left out.
+    """
+    frame = pd.DataFrame({"unit": units, "value": values}).dropna()
+    frame = frame[frame.groupby("unit")["unit"].transform("size") > 1]
+    if frame.empty:
+        return np.nan
+    unit_codes, _ = pd.factorize(frame["unit"])
+    value_codes, categories = pd.factorize(frame["value"].astype(str))
+
+    # counts[u, c]: how many coders gave unit u the value c
+    counts = np.zeros((unit_codes.max() + 1, len(categories)))
+    np.add.at(counts, (unit_codes, value_codes), 1)
+    weights = 1.0 / (counts.sum(axis=1) - 1)
+
+    # Coincidence matrix: pairs of values within a unit, each unit weighted by 1 / (m_u - 1)
+    coincidences = counts.T @ (counts * weights[:, None]) - np.diag((counts * weights[:, None]).sum(axis=0))
+    totals = coincidences.sum(axis=1)
+    n = totals.sum()
+    expected_disagreement = n ** 2 - (totals ** 2).sum()
+    if expected_disagreement == 0:
+        return np.nan
+    return 1 - (n - 1) * (n - np.trace(coincidences)) / expected_disagreement
+
+
+# --------------------------
+# Conditions
+# --------------------------
+
+def condition_mask(condition, frame):
+    """Vectorized condition_met: which rows of a (row x variable) frame satisfy a compiled condition"""
+    if not condition:
+        return np.ones(len(frame), dtype=bool)
+    result = np.zeros(len(frame), dtype=bool)
+    for group in condition:
+        group_mask = np.ones(len(frame), dtype=bool)
+        for parent, op, allowed in group:
+            values = frame[parent] if parent in frame else pd.Series(None, index=frame.index, dtype=object)
+            hit = values.isin(list(allowed)).to_numpy()
+            if op in ("=", "in"):
+                group_mask &= hit
+            else:
+                group_mask &= values.notna().to_numpy() & ~hit
+        result |= group_mask
+    return result
+
+
+# --------------------------
+# Incremental statistics
+# --------------------------
+
+class AnnotationStats:
+    """Latest annotation values of a database, refreshed from the rows saved since the last refresh"""
+
+    def __init__(self, db_path, table_name="annotations", storage="wide"):
+        self.db_path = db_path
+        self.table_name = table_name
+        self.storage = storage
+        self.values = pd.DataFrame({col: pd.Categorical([]) for col in CATEGORY_COLUMNS})
+        self.values["timestamp"] = pd.Series(dtype=object)
+        self.newest = None
+        self._keys = None
+        self._cache = {}
+        # Streamlit shares one instance between sessions
+        self.lock = threading.Lock()
+
+    def _read_since(self, conn, since):
+        if self.storage == "long":
+            table = f"{self.table_name}_values"
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone():
+                return self.values.iloc[:0]
+            return pd.read_sql(
+                f"SELECT entry_id, variable, coder, value, timestamp FROM {table} WHERE timestamp > ?",
+                conn, params=(since,)
+            )
+
+        table = self.table_name
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if not columns:
+            return self.values.iloc[:0]
+        # The text column is left out; only the labels are needed
+        variables = [col for col in columns if col not in WIDE_META_COLUMNS]
+        selected = ["id", "timestamp"] + (["coder"] if "coder" in columns else []) + variables
+        rows = pd.read_sql(f"SELECT {', '.join(selected)} FROM {table} WHERE timestamp > ?", conn, params=(since,))
+        if "coder" not in rows:
+            rows["coder"] = ""
+        return rows.rename(columns={"id": "entry_id"}).melt(
+            id_vars=["entry_id", "coder", "timestamp"], value_vars=variables,
+            var_name="variable", value_name="value"
+        )
+
+    def refresh(self):
+        """Read the rows saved since the last refresh; returns how many values changed"""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self):
+        since = ""
+        if self.newest:
+            since = (datetime.fromisoformat(self.newest) - timedelta(seconds=REREAD_SECONDS)).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            new = self._read_since(conn, since)
+        finally:
+            conn.close()
+        if new.empty:
+            return 0
+
+        new["coder"] = new["coder"].fillna("")
+        new["value"] = new["value"].where(new["value"].notna() & (new["value"].astype(str) != ""))
+        new["entry_id"] = new["entry_id"].astype(str)
+        new["value"] = new["value"].map(str, na_action="ignore")
+        new = new.drop_duplicates(subset=KEY_COLUMNS, keep="last").reset_index(drop=True)
+        self.newest = max(filter(None, [self.newest, new["timestamp"].max()]))
+
+        # Most re-read rows (the REREAD_SECONDS overlap) repeat a value already held
+        positions = self._key_index().get_indexer(pd.MultiIndex.from_frame(new[KEY_COLUMNS]))
+        found = positions >= 0
+        held = self.values["value"].iloc[positions[found]].astype(object).to_numpy()
+        fresh = new["value"].to_numpy(dtype=object)[found]
+        unchanged = np.zeros(len(new), dtype=bool)
+        unchanged[found] = (held == fresh) | (pd.isna(held) & pd.isna(fresh))
+        new, positions, found = new[~unchanged], positions[~unchanged], found[~unchanged]
+        if new.empty:
+            return 0
+
+        # Categoricals keep grouping and pivoting on integer codes; extending
+        # the categories only remaps the codes of the rows already held
+        values = self.values.copy()
+        for col in CATEGORY_COLUMNS:
+            categories = values[col].cat.categories.union(pd.Index(new[col].dropna().unique()))
+            if len(categories) > len(values[col].cat.categories):
+                values[col] = values[col].cat.set_categories(categories)
+            new[col] = pd.Categorical(new[col], categories=categories)
+
+        # Changed values are overwritten in place; only unseen keys are appended
+        for col in ["value", "timestamp"]:
+            values.iloc[positions[found], values.columns.get_loc(col)] = new[col][found].to_numpy()
+        if not found.all():
+            values = pd.concat([values, new.loc[~found, values.columns]], ignore_index=True)
+            self._keys = None
+        self.values = values
+
+        # Only the variables whose values changed need their numbers recomputed
+        changed = set(new["variable"].unique())
+        self._cache = {key: value for key, value in self._cache.items()
+                       if key[1] is not None and key[1] not in changed}
+        return len(new)
+
+    def _key_index(self):
+        """(entry, variable, coder) of every held row, kept until rows are appended"""
+        if self._keys is None:
+            self._keys = pd.MultiIndex.from_frame(self.values[KEY_COLUMNS])
+        return self._keys
+
+    def _cached(self, metric, variable, compute):
+        key = (metric, variable)
+        with self.lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    def _coded(self, variable):
+        values = self.values
+        return values[(values["variable"] == variable) & values["value"].notna()]
+
+    def coders(self):
+        return sorted(self.values["coder"].unique())
+
+    def distribution(self, variable):
+        """Count and share of each value of a variable, over all coders"""
+        def compute():
+            counts = self._coded(variable)["value"].astype(str).value_counts()
+            return pd.DataFrame({"count": counts, "share": counts / counts.sum() if len(counts) else counts})
+        return self._cached("distribution", variable, compute)
+
+    def completion(self, variables, total_entries=None):
+        """Per variable: annotations that have a value, out of those where its condition applies.
+
+        variables are compiled as by sample_coding.compile_schema. When
+        total_entries is given, the share of the corpus annotated is added.
+        """
+        def compute():
+            # (entry, coder) x variable; the keys are unique, so unstack needs no aggregation
+            frame = self.values.dropna(subset=["value"]).set_index(
+                ["entry_id", "coder", "variable"])["value"].unstack("variable")
+            annotated = self.values.groupby(["entry_id", "coder"]).ngroups
+            rows = []
+            for var in variables:
+                name = var["name"]
+                applies = condition_mask(var["condition"], frame)
+                done = int(frame[name].notna().to_numpy()[applies].sum()) if name in frame else 0
+                # Annotations without any value still count where no condition applies
+                applicable = annotated if not var["condition"] else int(applies.sum())
+                rows.append({
+                    "variable": name,
+                    "coded": done,
+                    "applicable": applicable,
+                    "completion": done / applicable if applicable else np.nan,
+                })
+            table = pd.DataFrame(rows)
+            if total_entries:
+                table["corpus share"] = self.values["entry_id"].nunique() / total_entries
+            return table
+        # Depends on every variable, so any refresh with new rows recomputes it
+        metric = ("completion", tuple(var["name"] for var in variables), total_entries)
+        return self._cached(metric, None, compute)
+
+    def agreement(self, variable):
+        """Krippendorff's alpha over all coders and Cohen's kappa for every pair of coders"""
+        def compute():
+            coded = self._coded(variable)
+            alpha = krippendorff_alpha(coded["entry_id"], coded["value"])
+            # entry x coder value codes (-1 = not coded); a pair shares the entries both coded
+            by_coder = coded.assign(code=coded["value"].cat.codes).set_index(
+                ["entry_id", "coder"])["code"].unstack("coder", fill_value=-1)
+            pairs = []
+            coders = list(by_coder.columns)
+            for i, first in enumerate(coders):
+                for second in coders[i + 1:]:
+                    a, b = by_coder[first].to_numpy(), by_coder[second].to_numpy()
+                    shared = (a >= 0) & (b >= 0)
+                    if shared.any():
+                        pairs.append({
+                            "coder 1": first,
+                            "coder 2": second,
+                            "shared entries": int(shared.sum()),
+                            "kappa": cohens_kappa(a[shared], b[shared]),
+                        })
+            return alpha, pd.DataFrame(pairs, columns=["coder 1", "coder 2", "shared entries", "kappa"])
+        return self._cached("agreement", variable, compute)
@@ -0,0 +1,158 @@
+"""Zotero sync, save and keyword benchmarks for literature.py, against a local mock Zotero server"""
+
+import glob
+import itertools
+import os
+
+import numpy as np
+
+from corpora import SEED, literature_fields, text_pool, zotero_items
+from harness import benchmark, load_script, quiet_streamlit
+from mock_zotero import MockZotero
+
+# Entries saved per save run and items changed in Zotero per incremental sync
+SAVE_BATCH = 100
+CHANGED_ITEMS = 100
+
+# Words per note field
+NOTE_WORDS = 80
+
+_app = None
+
+
+def app():
+    """literature.py keeps its database in the working directory, which the runner sets to a scratch dir"""
+    global _app
+    if _app is None:
+        quiet_streamlit()
+        _app = load_script("literature.py", "# --- STREAMLIT GUI ---")
+    return _app
+
+
+def fresh_library(size, ctx):
+    """Empty literature.db holding `size` saved notes; returns a generator of new note fields"""
+    lit = app()
+    lit.get_pool.clear()
+    for path in glob.glob(os.path.join(ctx.workdir, "literature.db*")):
+        os.remove(path)
+
+    rng = np.random.default_rng(SEED)
+    pool = text_pool(NOTE_WORDS * 2, rng)
+    columns = ["zotero_key"] + lit.ENTRY_COLUMNS
+    with lit.get_pool().connection() as conn:
+        rows = []
+        keywords = set()
+        for i in range(size):
+            fields = literature_fields(i, rng, pool)
+            rows.append((f"K{i:07d}", *(fields[col] for col in lit.ENTRY_COLUMNS)))
+            keywords.update([(fields["keyword_DV"], "DV"), (fields["keyword_IV"], "IV"),
+                             (fields["keyword_method_case"], "method_case")])
+        conn.executemany(
+            f"INSERT INTO literature ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+        )
+        lit.add_keywords(conn.cursor(), keywords)
+        conn.commit()
+    lit.get_keywords.clear()
+    return (literature_fields(i, rng, pool) for i in itertools.count(size))
+
+
+def mock_library(size, ctx):
+    library = MockZotero(zotero_items(size)).start()
+    ctx.on_exit.append(library.stop)
+    return library
+
+
+@benchmark("literature.save_entry[new]", sizes="library")
+def save_new(size, ctx):
+    notes = fresh_library(size, ctx)
+    keys = itertools.count(size)
+
+    def save():
+        for _ in range(SAVE_BATCH):
+            app().save_entry(f"K{next(keys):07d}", next(notes))
+    return save
+
+
+@benchmark("literature.save_entry[update]", sizes="library")
+def save_update(size, ctx):
+    notes = fresh_library(size, ctx)
+    keys = [f"K{i:07d}" for i in range(min(SAVE_BATCH, size))]
+    fields = [next(notes) for _ in keys]
+    rounds = itertools.count()
+
+    def save():
+        # A different argument every round, so every save has a change to write
+        suffix = f" (revision {next(rounds)})"
+        for key, note in zip(keys, fields):
+            app().save_entry(key, dict(note, argument=note["argument"] + suffix))
+    return save
+
+
+@benchmark("literature.get_keywords", sizes="library")
+def get_keywords(size, ctx):
+    fresh_library(size, ctx)
+
+    def load():
+        app().get_keywords.clear()
+        for keyword_type in ("DV", "IV", "method_case"):
+            app().get_keywords(keyword_type)
+    return load
+
+
+@benchmark("literature.search_entries", sizes="library")
+def search_entries(size, ctx):
+    fresh_library(size, ctx)
+    if not app().get_pool().fts_available:
+        return None
+    return lambda: app().search_entries("study evidence")
+
+
+def reset_mirror():
+    with app().get_pool().connection() as conn:
+        conn.execute("DELETE FROM zotero_items")
+        conn.execute("DELETE FROM zotero_sync")
+        conn.commit()
+
+
+@benchmark("literature.zotero_sync[full]", sizes="library")
+def zotero_sync_full(size, ctx):
+    fresh_library(0, ctx)
+    library = mock_library(size, ctx)
+    session = app().get_zotero_session()
+
+    def sync():
+        reset_mirror()
+        app().sync_zotero_mirror(library.url, session)
+    return sync
+
+
+@benchmark("literature.zotero_sync[changed]", sizes="library")
+def zotero_sync_changed(size, ctx):
+    """Incremental sync after CHANGED_ITEMS items were edited in Zotero"""
+    fresh_library(0, ctx)
+    library = mock_library(size, ctx)
+    session = app().get_zotero_session()
+    app().sync_zotero_mirror(library.url, session)
+
+    def sync():
+        library.touch(CHANGED_ITEMS)
+        app().sync_zotero_mirror(library.url, session)
+    return sync
+
+
+@benchmark("literature.zotero_sync[unchanged]", sizes="library")
+def zotero_sync_unchanged(size, ctx):
+    fresh_library(0, ctx)
+    library = mock_library(size, ctx)
+    session = app().get_zotero_session()
+    app().sync_zotero_mirror(library.url, session)
+    return lambda: app().sync_zotero_mirror(library.url, session)
+
+
+@benchmark("literature.load_items", sizes="library")
+def load_items(size, ctx):
+    """Reading the synced mirror into the item picker"""
+    fresh_library(0, ctx)
+    library = mock_library(size, ctx)
+    app().sync_zotero_mirror(library.url, app().get_zotero_session())
+    return lambda: app().fetch_zotero_items_full()
@@ -0,0 +1,124 @@
+"""Upload, navigate, save and read-back benchmarks for sample_coding.py"""
+
+import hashlib
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from corpora import annotation_records, corpus_path
+from harness import benchmark, load_script, quiet_streamlit
+
+# Annotations saved per save run
+SAVE_BATCH = 1000
+
+# Annotations written per transaction when filling a database before a benchmark
+FILL_BATCH = 10_000
+
+# Queue entries walked per navigation run
+NAVIGATE_ENTRIES = 1000
+
+_app = None
+
+
+def app():
+    global _app
+    if _app is None:
+        quiet_streamlit()
+        _app = load_script("sample_coding.py", "# --------------------------\n# Streamlit App")
+    return _app
+
+
+def filled_db(size, ctx, storage):
+    """Database with `size` saved annotations, written straight through write_annotations"""
+    db_path = os.path.join(ctx.workdir, f"annotations_{storage}_{size}.db")
+    if not os.path.exists(db_path):
+        db = app().get_db(db_path)
+        records = annotation_records(size, coders=("ann", "bob"))
+        while batch := list(itertools.islice(records, FILL_BATCH)):
+            app().write_annotations(db, batch, storage=storage)
+    return db_path
+
+
+@benchmark("sample_coding.load_csv")
+def load_csv(size, ctx):
+    """First upload of a file: hashing and parsing (and the Parquet spill for large files)"""
+    with open(corpus_path(ctx.cache_dir, size, ctx.words), "rb") as f:
+        data = f.read()
+
+    def upload():
+        content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+        spill_path = os.path.join(tempfile.gettempdir(), f"upload_{content_hash}.parquet")
+        if os.path.exists(spill_path):
+            os.remove(spill_path)
+        app().load_csv.clear()
+        app().load_csv(content_hash, data)
+    return upload
+
+
+@benchmark("sample_coding.navigate")
+def navigate(size, ctx):
+    """Building the id/text arrays for a column choice, then walking the queue in prefetch windows"""
+    pd = app().pd
+    df = pd.read_csv(corpus_path(ctx.cache_dir, size, ctx.words))
+    positions = np.random.default_rng(size).permutation(size)
+    steps = range(0, min(NAVIGATE_ENTRIES, size), app().PREFETCH_ENTRIES)
+
+    def walk():
+        app().column_arrays.clear()
+        ids, texts, _ = app().column_arrays(str(size), "id", "text", df)
+        for start in steps:
+            app().prefetch_entries(positions, start, ids, texts)
+    return walk
+
+
+def save_label(size, ctx, storage):
+    db_path = filled_db(size, ctx, storage)
+    ids = itertools.count(size)
+    labels = {"topic": "economy", "tone": "neutral"}
+
+    def save():
+        for _ in range(SAVE_BATCH):
+            entry_id = str(next(ids))
+            app().save_label(db_path, entry_id, f"text {entry_id}", labels, storage=storage, coder="ann")
+        app().get_writer(db_path).flush()
+    return save
+
+
+@benchmark("sample_coding.save_label[wide]")
+def save_label_wide(size, ctx):
+    return save_label(size, ctx, app().STORAGE_WIDE)
+
+
+@benchmark("sample_coding.save_label[long]")
+def save_label_long(size, ctx):
+    return save_label(size, ctx, app().STORAGE_LONG)
+
+
+@benchmark("sample_coding.get_all_entries[wide]")
+def get_all_entries_wide(size, ctx):
+    db_path = filled_db(size, ctx, app().STORAGE_WIDE)
+    return lambda: app().get_all_entries(db_path)
+
+
+@benchmark("sample_coding.get_all_entries[long]")
+def get_all_entries_long(size, ctx):
+    db_path = filled_db(size, ctx, app().STORAGE_LONG)
+    return lambda: app().get_all_entries(db_path, storage=app().STORAGE_LONG)
+
+
+@benchmark("sample_coding.analytics_refresh")
+def analytics_refresh(size, ctx):
+    """Dashboard numbers from scratch: reading every annotation and computing all metrics"""
+    db_path = filled_db(size, ctx, app().STORAGE_LONG)
+    variables = app().compile_schema("topic: politics, economy, health, other\ntone: positive, neutral, negative")
+
+    def refresh():
+        stats = app().AnnotationStats(db_path, storage=app().STORAGE_LONG)
+        stats.refresh()
+        stats.completion(variables)
+        for var in variables:
+            stats.distribution(var["name"])
+            stats.agreement(var["name"])
+    return refresh
@@ -0,0 +1,110 @@
+"""Load, navigate and save benchmarks for SpeechClicker3.2.py"""
+
+import os
+import random
+
+from corpora import corpus_path
+from harness import benchmark, load_script
+
+# Rows visited per navigation run and labelled per save run
+NAVIGATE_ROWS = 1000
+EDITED_ROWS = 1000
+
+_app = None
+
+
+def app():
+    global _app
+    if _app is None:
+        _app = load_script("SpeechClicker3.2.py")
+    return _app
+
+
+def random_rows(size, count=NAVIGATE_ROWS):
+    return random.Random(size).sample(range(size), min(count, size))
+
+
+@benchmark("speechclicker.read_csv")
+def read_csv(size, ctx):
+    path = corpus_path(ctx.cache_dir, size, ctx.words)
+    pd = app().import_pandas()
+    return lambda: app().FrameSource(pd.read_csv(path))
+
+
+@benchmark("speechclicker.lazy_index")
+def lazy_index(size, ctx):
+    path = corpus_path(ctx.cache_dir, size, ctx.words)
+
+    def index():
+        source = app().LazyCSVSource(path)
+        source._index_all()
+        source.close()
+    return index
+
+
+@benchmark("speechclicker.lazy_navigate")
+def lazy_navigate(size, ctx):
+    source = app().LazyCSVSource(corpus_path(ctx.cache_dir, size, ctx.words))
+    source._index_all()
+    ctx.on_exit.append(source.close)
+    rows = random_rows(size)
+    return lambda: [source.get(row, "text") for row in rows]
+
+
+@benchmark("speechclicker.read_parquet")
+def read_parquet(size, ctx):
+    try:
+        path = corpus_path(ctx.cache_dir, size, ctx.words, fmt="parquet")
+    except ImportError:
+        return None  # needs pyarrow
+
+    def load():
+        # Opening reads the schema; the first get loads the text column only
+        source = app().ProjectedSource(path)
+        source.get(0, "text")
+    return load
+
+
+@benchmark("speechclicker.save")
+def save(size, ctx):
+    pd = app().import_pandas()
+    source = app().FrameSource(pd.read_csv(corpus_path(ctx.cache_dir, size, ctx.words)))
+    source.ensure_column("label")
+    rows = random_rows(size, EDITED_ROWS)
+    output = os.path.join(ctx.workdir, "speechclicker_save.csv")
+
+    def label_and_write():
+        for row in rows:
+            source.set(row, "label", "1")
+        source.write(output)
+    return label_and_write
+
+
+@benchmark("speechclicker.lazy_save")
+def lazy_save(size, ctx):
+    source = app().LazyCSVSource(corpus_path(ctx.cache_dir, size, ctx.words))
+    source._index_all()
+    ctx.on_exit.append(source.close)
+    source.ensure_column("label")
+    rows = random_rows(size, EDITED_ROWS)
+    output = os.path.join(ctx.workdir, "speechclicker_lazy_save.csv")
+
+    def label_and_write():
+        for row in rows:
+            source.set(row, "label", "1")
+        source.write(output)
+    return label_and_write
+
+
+@benchmark("speechclicker.journal_record", sizes=None)
+def journal_record(size, ctx):
+    data_path = os.path.join(ctx.workdir, "journal_data.csv")
+    journal = app().AnnotationJournal(data_path)
+    ctx.on_exit.append(journal.close)
+
+    def record():
+        for row in range(EDITED_ROWS):
+            journal.record(row, "label", "1")
+        journal.sync()
+    return record
+
@@ -0,0 +1,156 @@
+"""Synthetic data for the benchmarks: text corpora, annotations, literature notes and Zotero items.
+
+Everything is generated from a fixed seed, so runs on different commits use
+the same data. Corpora are written once per (rows, words) and kept in the
+cache directory, since the large ones take a while to write.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+SEED = 20240601
+
+# Rows generated and written per step, so 10M-row corpora never sit in memory at once
+CORPUS_CHUNK_ROWS = 250_000
+
+# Distinct text halves; each row joins two, which gives millions of distinct texts
+TEXT_POOL_SIZE = 4096
+
+VOCABULARY_SIZE = 5000
+SPEAKERS = ["Speaker A", "Speaker B", "Moderator", "Guest"]
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text):
+    """'10k' -> 10000, '2m' -> 2000000, '500' -> 500"""
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for suffix, factor in sorted(SIZE_SUFFIXES.items(), key=lambda item: -item[1]):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return str(size)
+
+
+def vocabulary(rng):
+    """Pseudo-words of 2-10 letters"""
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lengths = rng.integers(2, 11, VOCABULARY_SIZE)
+    return np.array(["".join(rng.choice(letters, length)) for length in lengths])
+
+
+def text_pool(words, rng):
+    """TEXT_POOL_SIZE texts of about words / 2 words each"""
+    vocab = vocabulary(rng)
+    half = max(words // 2, 1)
+    picks = rng.integers(0, len(vocab), (TEXT_POOL_SIZE, half))
+    return np.array([" ".join(row) for row in vocab[picks]], dtype=object)
+
+
+def make_texts(count, pool, rng):
+    first = pd.Series(pool[rng.integers(0, len(pool), count)])
+    second = pd.Series(pool[rng.integers(0, len(pool), count)])
+    return (first + ". " + second).to_numpy()
+
+
+def corpus_chunks(rows, words, seed=SEED):
+    """DataFrames of CORPUS_CHUNK_ROWS rows with id, speaker, text and an empty label column"""
+    rng = np.random.default_rng(seed)
+    pool = text_pool(words, rng)
+    for start in range(0, rows, CORPUS_CHUNK_ROWS):
+        count = min(CORPUS_CHUNK_ROWS, rows - start)
+        yield pd.DataFrame({
+            "id": np.arange(start, start + count),
+            "speaker": np.array(SPEAKERS)[rng.integers(0, len(SPEAKERS), count)],
+            "text": make_texts(count, pool, rng),
+            "label": "",
+        })
+
+
+def corpus_path(cache_dir, rows, words, fmt="csv"):
+    """Path of a cached corpus, writing it first if needed (fmt: csv or parquet)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"corpus_{format_size(rows)}_{words}w.{fmt}")
+    if os.path.exists(path):
+        return path
+
+    partial = path + ".partial"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in corpus_chunks(rows, words):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer = writer or pq.ParquetWriter(partial, table.schema)
+            writer.write_table(table)
+        writer.close()
+    else:
+        for i, chunk in enumerate(corpus_chunks(rows, words)):
+            chunk.to_csv(partial, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    os.replace(partial, path)
+    return path
+
+
+def annotation_records(count, start=0, coders=("",), seed=SEED):
+    """Records as taken by sample_coding.write_annotations, labelling variables topic and tone"""
+    rng = np.random.default_rng(seed + start)
+    topics = np.array(["politics", "economy", "health", "other"])[rng.integers(0, 4, count)]
+    tones = np.array(["positive", "neutral", "negative"])[rng.integers(0, 3, count)]
+    coder_names = np.array(coders)[rng.integers(0, len(coders), count)]
+    timestamp = "2024-06-01T00:00:00"
+    for i in range(count):
+        yield (str(start + i), f"text {start + i}", timestamp,
+               {"topic": topics[i], "tone": tones[i]}, coder_names[i], None)
+
+
+def literature_fields(index, rng, pool):
+    """Form fields of one literature note, as passed to literature.save_entry"""
+    return {
+        "authors": f"Author {index % 997}, Author {index % 389}",
+        "institutions": f"University {index % 53}",
+        "year": int(1960 + index % 65),
+        "title": f"Study {index}: {pool[index % len(pool)][:60]}",
+        "journal": f"Journal {index % 211}",
+        "book_press": "",
+        "keyword_DV": f"dv{index % 150}",
+        "keyword_IV": f"iv{index % 120}",
+        "keyword_method_case": f"method{index % 40}",
+        "argument": pool[rng.integers(0, len(pool))],
+        "method": pool[rng.integers(0, len(pool))],
+        "evidence": pool[rng.integers(0, len(pool))],
+        "implication": pool[rng.integers(0, len(pool))],
+        "further_research": pool[rng.integers(0, len(pool))],
+        "happy_thoughts": "",
+        "unhappy_thoughts": "",
+    }
+
+
+def zotero_items(count, seed=SEED):
+    """Items shaped like the Zotero web API's /items response; item i has version i + 1"""
+    rng = np.random.default_rng(seed)
+    vocab = vocabulary(rng)
+    items = []
+    for i in range(count):
+        key = f"K{i:07d}"
+        data = {
+            "key": key,
+            "version": i + 1,
+            "itemType": "journalArticle",
+            "title": " ".join(vocab[rng.integers(0, len(vocab), 8)]).capitalize(),
+            "creators": [{"creatorType": "author", "firstName": "A.", "lastName": vocab[rng.integers(0, len(vocab))]}
+                         for _ in range(int(rng.integers(1, 4)))],
+            "publicationTitle": f"Journal {i % 211}",
+            "date": str(1960 + i % 65),
+            "publisher": "",
+            "abstractNote": " ".join(vocab[rng.integers(0, len(vocab), 120)]),
+        }
+        items.append({"key": key, "version": i + 1, "data": data})
+    return items
+
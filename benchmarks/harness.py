@@ -0,0 +1,98 @@
+"""Benchmark registry, timing and memory measurement, and loading of the apps' functions"""
+
+import gc
+import importlib.util
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Registered benchmarks, in the order they were defined
+BENCHMARKS = []
+
+
+def benchmark(name, sizes="rows"):
+    """Register a benchmark.
+
+    The decorated function is called as setup(size, ctx) and returns the
+    operation to time (a function without arguments). `sizes` picks which size
+    list from the command line it runs for: "rows" (corpus rows) or "library"
+    (Zotero and literature library sizes).
+    """
+    def register(setup):
+        BENCHMARKS.append({"name": name, "sizes": sizes, "setup": setup})
+        return setup
+    return register
+
+
+def measure(operation, rounds):
+    """Time `rounds` calls of an operation, then measure the peak memory of one more call.
+
+    Peak memory is what tracemalloc sees allocated on top of what was already
+    held, which covers Python objects and NumPy/pandas buffers but not memory
+    SQLite allocates on its own.
+    """
+    times = []
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "times": times,
+        "median": statistics.median(times),
+        "min": min(times),
+        "peak_bytes": peak,
+    }
+
+
+# --------------------------
+# Loading the apps
+# --------------------------
+
+def quiet_streamlit():
+    """Silence the warnings Streamlit logs when its functions run outside `streamlit run`"""
+    import streamlit.config
+    import streamlit.logger
+    # Streamlit re-applies its configured level when the config loads, so set both
+    streamlit.config.set_option("logger.level", "error")
+    streamlit.logger.set_log_level("error")
+
+
+def load_script(filename, stop_marker=None):
+    """Import one of the app scripts as a module.
+
+    The Streamlit apps build their page at import time, so for those only the
+    code above `stop_marker` (the start of the GUI section) is run.
+    """
+    path = os.path.join(REPO_DIR, filename)
+    name = os.path.splitext(filename)[0].replace(".", "_").lower()
+    if stop_marker is None:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    if stop_marker not in source:
+        raise RuntimeError(f"{filename} no longer contains the marker {stop_marker!r}")
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader(name, loader=None))
+    module.__file__ = path
+    sys.modules[name] = module
+    # The apps import sibling modules (e.g. annotation_analytics) from the repository
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    exec(compile(source.split(stop_marker)[0], path, "exec"), module.__dict__)
+    return module
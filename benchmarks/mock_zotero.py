@@ -0,0 +1,125 @@
+"""Local stand-in for the Zotero web API, for benchmarking literature.py's sync without the network.
+
+Serves /users/<id>/items with limit/start paging, the `since` parameter and
+If-Modified-Since-Version (answered with 304), and /users/<id>/deleted. Run
+it on its own to point the app at it by hand:
+
+    python benchmarks/mock_zotero.py --items 5000 --port 8099
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from corpora import parse_size, zotero_items
+
+MAX_PAGE_SIZE = 100
+
+
+class MockZotero:
+    """A library of synthetic items served over HTTP on localhost"""
+
+    def __init__(self, items, port=0):
+        self.items = {item["key"]: item for item in items}
+        self.version = max((item["version"] for item in items), default=0)
+        self.deleted = {}  # key -> library version it was deleted at
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Items URL, to pass as api_url to literature.sync_zotero_mirror"""
+        return f"http://127.0.0.1:{self.server.server_port}/users/1/items"
+
+    def touch(self, count):
+        """Give `count` items a new version, as if they were edited in Zotero"""
+        with self.lock:
+            for key in list(self.items)[:count]:
+                self.version += 1
+                item = self.items[key]
+                item["version"] = item["data"]["version"] = self.version
+
+    def _handler(self):
+        library = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass  # keep benchmark output clean
+
+            def send_json(self, body, headers):
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, str(value))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                since = int(params.get("since", 0))
+                with library.lock:
+                    version = library.version
+                    if url.path.endswith("/deleted"):
+                        keys = [key for key, at in library.deleted.items() if at > since]
+                        self.send_json({"items": keys}, {"Last-Modified-Version": version})
+                        return
+                    if not url.path.endswith("/items"):
+                        self.send_error(404)
+                        return
+                    if int(self.headers.get("If-Modified-Since-Version", -1)) >= version:
+                        self.send_response(304)
+                        self.send_header("Last-Modified-Version", str(version))
+                        self.end_headers()
+                        return
+                    matching = [item for item in library.items.values() if item["version"] > since]
+
+                start = int(params.get("start", 0))
+                limit = min(int(params.get("limit", 25)), MAX_PAGE_SIZE)
+                self.send_json(matching[start:start + limit], {
+                    "Total-Results": len(matching),
+                    "Last-Modified-Version": version,
+                })
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a synthetic Zotero library on localhost.")
+    parser.add_argument("--items", default="1k", help="number of items, e.g. 5000 or 10k (default: 1k)")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args(argv)
+
+    library = MockZotero(zotero_items(parse_size(args.items)), port=args.port)
+    print(f"📚 Serving {len(library.items)} items at {library.url} (Ctrl+C to stop)")
+    try:
+        library.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        library.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
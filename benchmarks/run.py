@@ -0,0 +1,164 @@
+"""Benchmark suite for the load, navigate and save paths of SpeechClicker, sample_coding and literature.
+
+Each benchmark runs on synthetic data at every requested size and reports the
+median and best time of several rounds plus the peak memory of one more
+round. Save results on one commit and compare another against them to track
+performance work:
+
+    python benchmarks/run.py                                  # 10k and 100k rows
+    python benchmarks/run.py --sizes 10k,1m,10m --words 300   # large corpora, long texts
+    python benchmarks/run.py -k literature --library-sizes 1k,10k,50k
+    python benchmarks/run.py --save baseline.json
+    python benchmarks/run.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+from datetime import datetime
+from types import SimpleNamespace
+
+# Importing the benchmark modules registers their benchmarks, in this order
+import bench_speechclicker  # noqa: F401
+import bench_sample_coding  # noqa: F401
+import bench_literature  # noqa: F401
+from corpora import format_size, parse_size
+from harness import BENCHMARKS, REPO_DIR, measure
+
+# A result this much slower (or faster) than the baseline is flagged
+CHANGE_THRESHOLD = 0.10
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "speechclicker-benchmarks")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile the apps' load, navigate and save paths on synthetic data."
+    )
+    parser.add_argument("--sizes", default="10k,100k",
+                        help="corpus rows, comma separated, e.g. 10k,1m,10m (default: 10k,100k)")
+    parser.add_argument("--library-sizes", default="1k,10k",
+                        help="Zotero / literature library sizes (default: 1k,10k)")
+    parser.add_argument("--words", type=int, default=40, help="words per corpus text (default: 40)")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per benchmark (default: 5)")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="where generated corpora are kept between runs")
+    parser.add_argument("--save", metavar="FILE", help="write the results to a JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved with --save")
+    return parser.parse_args(argv)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GiB"
+
+
+def format_change(result, baseline):
+    """'1.25x slower' / '0.80x faster' / '' against the baseline result, if there is one"""
+    if not baseline:
+        return ""
+    ratio = result["median"] / baseline["median"]
+    if ratio > 1 + CHANGE_THRESHOLD:
+        return f"{ratio:.2f}x slower ⚠️"
+    if ratio < 1 - CHANGE_THRESHOLD:
+        return f"{ratio:.2f}x faster"
+    return f"{ratio:.2f}x"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    save_path = os.path.abspath(args.save) if args.save else None
+    sizes = {
+        "rows": [parse_size(size) for size in args.sizes.split(",")],
+        "library": [parse_size(size) for size in args.library_sizes.split(",")],
+        None: [None],
+    }
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+
+    # literature.py keeps its database in the working directory, so run in a scratch one
+    workdir = tempfile.mkdtemp(prefix="benchmarks-")
+    os.chdir(workdir)
+    ctx = SimpleNamespace(cache_dir=os.path.abspath(args.cache_dir), workdir=workdir,
+                          words=args.words, on_exit=[])
+
+    print(f"{'benchmark':<38} {'size':>6} {'median':>10} {'best':>10} {'peak mem':>10}  change")
+    results = []
+    failed = False
+    try:
+        for bench in BENCHMARKS:
+            if args.filter not in bench["name"]:
+                continue
+            for size in sizes[bench["sizes"]]:
+                label = format_size(size) if size is not None else "-"
+                try:
+                    operation = bench["setup"](size, ctx)
+                    if operation is None:
+                        print(f"{bench['name']:<38} {label:>6} {'skipped (dependency or feature missing)':>32}")
+                        continue
+                    result = measure(operation, args.rounds)
+                except Exception:
+                    failed = True
+                    print(f"{bench['name']:<38} {label:>6} ❌ failed:")
+                    traceback.print_exc()
+                    continue
+                result.update(name=bench["name"], size=size)
+                results.append(result)
+                print(f"{bench['name']:<38} {label:>6} {format_seconds(result['median']):>10} "
+                      f"{format_seconds(result['min']):>10} {format_bytes(result['peak_bytes']):>10}  "
+                      f"{format_change(result, baseline.get((bench['name'], size)))}", flush=True)
+    finally:
+        for cleanup in reversed(ctx.on_exit):
+            try:
+                cleanup()
+            except Exception:
+                pass
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": git_commit(),
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "words": args.words,
+                "rounds": args.rounds,
+                "results": results,
+            }, f, indent=2)
+        print(f"💾 Saved {len(results)} results to {save_path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
+import json
+import queue
 import sqlite3
+import threading
 import requests
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
 # --- CONFIG: Replace with your Zotero API key and library info ---
@@ -8,149 +14,460 @@ ZOTERO_API_KEY = "A3mf5yQmUGGCkyJIRUl2GdUS"
 ZOTERO_USER_ID = "13989914"
 ZOTERO_LIBRARY_TYPE = "user"  # "user" or "group"
 ZOTERO_API_URL = f"https://api.zotero.org/{ZOTERO_LIBRARY_TYPE}s/{ZOTERO_USER_ID}/items"
+ZOTERO_PAGE_SIZE = 100  # maximum allowed by the Zotero API
+ZOTERO_MAX_WORKERS = 4  # pages fetched at the same time
+ZOTERO_SYNC_SECONDS = 600  # how long the local mirror is used before asking Zotero for changes
+
+# Literature columns filled in through the form
+ENTRY_COLUMNS = [
+    "authors", "institutions", "year", "title", "journal", "book_press",
+    "keyword_DV", "keyword_IV", "keyword_method_case",
+    "argument", "method", "evidence", "implication", "further_research",
+    "happy_thoughts", "unhappy_thoughts"
+]
+
+# Literature columns covered by full-text search
+FTS_COLUMNS = [
+    "title", "authors", "argument", "method", "evidence", "implication",
+    "further_research", "happy_thoughts", "unhappy_thoughts"
+]
 
 # --- DATABASE SETUP ---
-conn = sqlite3.connect("literature.db", check_same_thread=False)
-c = conn.cursor()
-
-# Literature table
-c.execute('''
-CREATE TABLE IF NOT EXISTS literature (
-    id INTEGER PRIMARY KEY,
-    zotero_key TEXT UNIQUE,
-    authors TEXT,
-    institutions TEXT,
-    year INTEGER,
-    title TEXT,
-    journal TEXT,
-    book_press TEXT,
-    keyword_DV TEXT,
-    keyword_IV TEXT,
-    keyword_method_case TEXT,
-    argument TEXT,
-    method TEXT,
-    evidence TEXT,
-    implication TEXT,
-    further_research TEXT,
-    happy_thoughts TEXT,
-    unhappy_thoughts TEXT,
-    timestamp_created TEXT,
-    timestamp_updated TEXT
-)
-''')
-
-# Keywords table
-c.execute('''
-CREATE TABLE IF NOT EXISTS keywords (
-    id INTEGER PRIMARY KEY,
-    keyword TEXT UNIQUE,
-    type TEXT
-)
-''')
-
-conn.commit()
+DB_PATH = "literature.db"
+DB_POOL_SIZE = 4  # connections shared by all sessions
+DB_BUSY_TIMEOUT_MS = 5000  # how long a writer waits for another one before giving up
 
-# --- FUNCTIONS ---
+def init_db(conn):
+    """Create the tables, indexes and search index; returns whether full-text search is available"""
+    c = conn.cursor()
+
+    # Literature table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS literature (
+        id INTEGER PRIMARY KEY,
+        zotero_key TEXT UNIQUE,
+        authors TEXT,
+        institutions TEXT,
+        year INTEGER,
+        title TEXT,
+        journal TEXT,
+        book_press TEXT,
+        keyword_DV TEXT,
+        keyword_IV TEXT,
+        keyword_method_case TEXT,
+        argument TEXT,
+        method TEXT,
+        evidence TEXT,
+        implication TEXT,
+        further_research TEXT,
+        happy_thoughts TEXT,
+        unhappy_thoughts TEXT,
+        timestamp_created TEXT,
+        timestamp_updated TEXT
+    )
+    ''')
+
+    # Lets downstream copies pick up changes incrementally by timestamp_updated
+    c.execute("CREATE INDEX IF NOT EXISTS idx_literature_updated ON literature (timestamp_updated)")
+
+    # Keywords table
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS keywords (
+        id INTEGER PRIMARY KEY,
+        keyword TEXT UNIQUE,
+        type TEXT
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_keywords_type_keyword ON keywords (type, keyword)")
+
+    # Local mirror of the Zotero library
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS zotero_items (
+        zotero_key TEXT PRIMARY KEY,
+        version INTEGER,
+        title TEXT,
+        authors TEXT,
+        journal TEXT,
+        year TEXT,
+        book_press TEXT,
+        data TEXT
+    )
+    ''')
 
-def fetch_zotero_items_full():
-    """Fetch Zotero items with full metadata"""
-    headers = {"Zotero-API-Key": ZOTERO_API_KEY}
-    params = {"limit": 50}
+    # Library version the mirror is synced to (a single row)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS zotero_sync (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        library_version INTEGER,
+        synced_at TEXT
+    )
+    ''')
+
+    # Full-text index over the notes, kept in sync with the literature table by triggers
+    fts_cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{col}" for col in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{col}" for col in FTS_COLUMNS)
     try:
-        response = requests.get(ZOTERO_API_URL, headers=headers, params=params)
-        if response.status_code == 200:
-            items = response.json()
-            results = {}
-            for item in items:
-                data = item.get("data", {})
-                title = data.get("title", "No Title")
-                authors_list = data.get("creators", [])
-                authors = ", ".join([a.get("lastName", "") for a in authors_list])
-                journal = data.get("publicationTitle", "")
-                year = data.get("date", "")
-                book_press = data.get("publisher", "")
-                zotero_key = data.get("key")
-                display_name = f"{title} ({authors})"
-                results[display_name] = {
-                    "zotero_key": zotero_key,
-                    "title": title,
-                    "authors": authors,
-                    "journal": journal,
-                    "year": year,
-                    "book_press": book_press
-                }
-            return results
+        fts_exists = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'literature_fts'"
+        ).fetchone()
+        c.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS literature_fts USING fts5(
+            {fts_cols}, content='literature', content_rowid='id'
+        )
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS literature_fts_insert AFTER INSERT ON literature BEGIN
+            INSERT INTO literature_fts (rowid, {fts_cols}) VALUES (new.id, {new_cols});
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS literature_fts_delete AFTER DELETE ON literature BEGIN
+            INSERT INTO literature_fts (literature_fts, rowid, {fts_cols}) VALUES ('delete', old.id, {old_cols});
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS literature_fts_update AFTER UPDATE ON literature BEGIN
+            INSERT INTO literature_fts (literature_fts, rowid, {fts_cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO literature_fts (rowid, {fts_cols}) VALUES (new.id, {new_cols});
+        END
+        ''')
+        if not fts_exists:
+            # Index the entries that were saved before the search index existed
+            c.execute("INSERT INTO literature_fts (literature_fts) VALUES ('rebuild')")
+        fts_available = True
+    except sqlite3.OperationalError:
+        fts_available = False  # SQLite was built without FTS5
+
+    conn.commit()
+    return fts_available
+
+class ConnectionPool:
+    """Small pool of SQLite connections, so concurrent sessions never share a cursor"""
+
+    def __init__(self, db_path, size=DB_POOL_SIZE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        # Connections move between Streamlit's script threads, but only one borrower uses each
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; anything left uncommitted is rolled back when it is returned"""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+
+@st.cache_resource
+def get_pool(db_path=DB_PATH):
+    pool = ConnectionPool(db_path)
+    with pool.connection() as conn:
+        pool.fts_available = init_db(conn)
+    return pool
+
+FTS_AVAILABLE = get_pool().fts_available
+
+# --- FUNCTIONS ---
+
+@st.cache_resource
+def get_zotero_session():
+    """Shared HTTP session, so connections to the API are pooled and reused"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=ZOTERO_MAX_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Zotero-API-Key"] = ZOTERO_API_KEY
+    return session
+
+def fetch_zotero_page(session, api_url, start, since=None):
+    """Fetch one page of items changed after library version `since` (all items if None).
+
+    Returns the items, the total number of matching items and the current
+    library version. If nothing changed since `since`, Zotero answers 304 and
+    an empty page is returned.
+    """
+    params = {"limit": ZOTERO_PAGE_SIZE, "start": start}
+    headers = {}
+    if since is not None:
+        params["since"] = since
+        headers["If-Modified-Since-Version"] = str(since)
+    response = session.get(api_url, params=params, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return [], 0, since
+    response.raise_for_status()
+    items = response.json()
+    total = int(response.headers.get("Total-Results", len(items)))
+    version = int(response.headers.get("Last-Modified-Version", 0))
+    return items, total, version
+
+def fetch_all_zotero_items(api_url=ZOTERO_API_URL, session=None, since=None):
+    """Page through the library (or its changes); pages after the first are fetched concurrently.
+
+    Returns the items and the library version they correspond to.
+    """
+    session = session or get_zotero_session()
+    items, total, version = fetch_zotero_page(session, api_url, 0, since)
+    starts = range(ZOTERO_PAGE_SIZE, total, ZOTERO_PAGE_SIZE)
+    with ThreadPoolExecutor(max_workers=ZOTERO_MAX_WORKERS) as pool:
+        for page, _, _ in pool.map(lambda start: fetch_zotero_page(session, api_url, start, since), starts):
+            items.extend(page)
+    return items, version
+
+def fetch_deleted_zotero_keys(api_url, session, since):
+    """Keys of items deleted from the library after version `since`"""
+    deleted_url = api_url.rsplit("/items", 1)[0] + "/deleted"
+    response = session.get(deleted_url, params={"since": since}, timeout=30)
+    response.raise_for_status()
+    return response.json().get("items", [])
+
+def sync_zotero_mirror(api_url=ZOTERO_API_URL, session=None):
+    """Bring the local mirror up to date, transferring only changed items; returns how many changed"""
+    session = session or get_zotero_session()
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT library_version FROM zotero_sync WHERE id = 1").fetchone()
+    since = row[0] if row else None
+
+    items, version = fetch_all_zotero_items(api_url, session, since)
+    changed = since is not None and version != since
+    deleted = fetch_deleted_zotero_keys(api_url, session, since) if changed else []
+
+    rows = []
+    for item in items:
+        data = item.get("data", {})
+        rows.append((
+            data.get("key"),
+            item.get("version", data.get("version")),
+            data.get("title", "No Title"),
+            ", ".join([a.get("lastName", "") for a in data.get("creators", [])]),
+            data.get("publicationTitle", ""),
+            data.get("date", ""),
+            data.get("publisher", ""),
+            json.dumps(data),
+        ))
+    with get_pool().connection() as conn:
+        c = conn.cursor()
+        c.executemany('''
+            INSERT OR REPLACE INTO zotero_items
+                (zotero_key, version, title, authors, journal, year, book_press, data)
+            VALUES (?,?,?,?,?,?,?,?)
+        ''', rows)
+        c.executemany("DELETE FROM zotero_items WHERE zotero_key = ?", [(key,) for key in deleted])
+        c.execute(
+            "INSERT OR REPLACE INTO zotero_sync (id, library_version, synced_at) VALUES (1, ?, ?)",
+            (version, datetime.now().isoformat())
+        )
+        conn.commit()
+    return len(rows) + len(deleted)
+
+@st.cache_resource
+def zotero_sync_failures():
+    """When the last sync failed, shared by all sessions, so an outage is not retried on every rerun"""
+    return {"failed_at": None}
+
+def zotero_sync_due():
+    """True if the mirror was never synced or the last sync is older than ZOTERO_SYNC_SECONDS.
+
+    After a failed sync the mirror is used for another ZOTERO_SYNC_SECONDS
+    before Zotero is asked again.
+    """
+    failed_at = zotero_sync_failures()["failed_at"]
+    if failed_at and (datetime.now() - failed_at).total_seconds() <= ZOTERO_SYNC_SECONDS:
+        return False
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT synced_at FROM zotero_sync WHERE id = 1").fetchone()
+    if not row:
+        return True
+    age = datetime.now() - datetime.fromisoformat(row[0])
+    return age.total_seconds() > ZOTERO_SYNC_SECONDS
+
+def fetch_zotero_items_full(force_sync=False):
+    """Return Zotero items with full metadata from the local mirror, syncing it when due"""
+    if force_sync or zotero_sync_due():
+        failures = zotero_sync_failures()
+        retry = f"Showing the local copy; trying again in {ZOTERO_SYNC_SECONDS // 60} minutes."
+        try:
+            with st.spinner("Syncing Zotero library..."):
+                sync_zotero_mirror()
+        except requests.HTTPError as e:
+            failures["failed_at"] = datetime.now()
+            st.error(f"Failed to fetch Zotero items. Status code: {e.response.status_code}. {retry}")
+        except Exception as e:
+            failures["failed_at"] = datetime.now()
+            st.error(f"Error fetching Zotero items: {e}. {retry}")
         else:
-            st.error(f"Failed to fetch Zotero items. Status code: {response.status_code}")
-            return {}
-    except Exception as e:
-        st.error(f"Error fetching Zotero items: {e}")
-        return {}
+            failures["failed_at"] = None
 
+    results = {}
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT zotero_key, title, authors, journal, year, book_press FROM zotero_items ORDER BY title"
+        ).fetchall()
+    for zotero_key, title, authors, journal, year, book_press in rows:
+        display_name = f"{title} ({authors})"
+        results[display_name] = {
+            "zotero_key": zotero_key,
+            "title": title,
+            "authors": authors,
+            "journal": journal,
+            "year": year,
+            "book_press": book_press
+        }
+    return results
+
+@st.cache_data
 def get_keywords(keyword_type):
-    """Return a list of existing keywords for a given type"""
-    c.execute("SELECT keyword FROM keywords WHERE type = ?", (keyword_type,))
-    return [k[0] for k in c.fetchall()]
+    """Return a list of existing keywords for a given type (cached until new keywords are added)"""
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT keyword FROM keywords WHERE type = ? ORDER BY keyword", (keyword_type,))
+        return [k[0] for k in rows]
+
+def add_keywords(c, keywords):
+    """Add (keyword, type) pairs to the pool in the current transaction; returns True if any were new"""
+    rows = [(keyword.strip(), keyword_type) for keyword, keyword_type in keywords if keyword.strip()]
+    c.executemany("INSERT OR IGNORE INTO keywords (keyword, type) VALUES (?, ?)", rows)
+    return c.rowcount > 0
+
+def read_entry(c, zotero_key):
+    c.execute(f"SELECT {', '.join(ENTRY_COLUMNS)}, timestamp_updated FROM literature WHERE zotero_key = ?",
+              (zotero_key,))
+    row = c.fetchone()
+    return dict(zip(ENTRY_COLUMNS + ["timestamp_updated"], row)) if row else None
 
-def add_keyword(keyword, keyword_type):
-    """Add a new keyword to the pool if it doesn't exist"""
-    if keyword.strip() == "":
+def get_entry(zotero_key):
+    """Return the saved fields of an entry, or None if the item has not been saved yet"""
+    with get_pool().connection() as conn:
+        return read_entry(conn.cursor(), zotero_key)
+
+def update_entry(conn, zotero_key, fields, saved):
+    """Updates only the columns that changed, in a single UPDATE statement"""
+    changed = {col: fields[col] for col in ENTRY_COLUMNS if fields[col] != saved[col]}
+    if not changed:
+        st.info("No changes to save.")
         return
-    try:
-        c.execute("INSERT INTO keywords (keyword, type) VALUES (?, ?)", (keyword.strip(), keyword_type))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass  # already exists
+
+    assignments = ", ".join(f"{col} = ?" for col in changed)
+    c = conn.cursor()
+    c.execute(
+        f"UPDATE literature SET {assignments}, timestamp_updated = ? WHERE zotero_key = ?",
+        (*changed.values(), datetime.now().isoformat(), zotero_key)
+    )
+    keyword_types = {"keyword_DV": "DV", "keyword_IV": "IV", "keyword_method_case": "method_case"}
+    new_keywords = add_keywords(c, [(changed[col], kw_type) for col, kw_type in keyword_types.items() if col in changed])
+    conn.commit()
+
+    if new_keywords:
+        get_keywords.clear()
+    st.success(f"Entry updated ({len(changed)} field(s) changed).")
 
 def save_entry(zotero_key, fields):
-    """Saves an entry to the database; prevents duplicates"""
-    timestamp = datetime.now().isoformat()
-    try:
-        c.execute('''
-            INSERT INTO literature (
-                zotero_key, authors, institutions, year, title, journal, book_press,
-                keyword_DV, keyword_IV, keyword_method_case,
-                argument, method, evidence, implication, further_research,
-                happy_thoughts, unhappy_thoughts, timestamp_created, timestamp_updated
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        ''', (
-            zotero_key,
-            fields['authors'],
-            fields['institutions'],
-            fields['year'],
-            fields['title'],
-            fields['journal'],
-            fields['book_press'],
-            fields['keyword_DV'],
-            fields['keyword_IV'],
-            fields['keyword_method_case'],
-            fields['argument'],
-            fields['method'],
-            fields['evidence'],
-            fields['implication'],
-            fields['further_research'],
-            fields['happy_thoughts'],
-            fields['unhappy_thoughts'],
-            timestamp,
-            timestamp
-        ))
-        conn.commit()
-        st.success("Entry saved successfully!")
+    """Saves an entry to the database; existing entries are updated instead"""
+    with get_pool().connection() as conn:
+        c = conn.cursor()
+        # Take the write lock first, so the check below and the write see the same data
+        c.execute("BEGIN IMMEDIATE")
+        saved = read_entry(c, zotero_key)
+        if saved:
+            update_entry(conn, zotero_key, fields, saved)
+            return
+
+        timestamp = datetime.now().isoformat()
+        try:
+            c.execute('''
+                INSERT INTO literature (
+                    zotero_key, authors, institutions, year, title, journal, book_press,
+                    keyword_DV, keyword_IV, keyword_method_case,
+                    argument, method, evidence, implication, further_research,
+                    happy_thoughts, unhappy_thoughts, timestamp_created, timestamp_updated
+                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            ''', (
+                zotero_key,
+                fields['authors'],
+                fields['institutions'],
+                fields['year'],
+                fields['title'],
+                fields['journal'],
+                fields['book_press'],
+                fields['keyword_DV'],
+                fields['keyword_IV'],
+                fields['keyword_method_case'],
+                fields['argument'],
+                fields['method'],
+                fields['evidence'],
+                fields['implication'],
+                fields['further_research'],
+                fields['happy_thoughts'],
+                fields['unhappy_thoughts'],
+                timestamp,
+                timestamp
+            ))
 
-        # Add new keywords to the pool
-        add_keyword(fields['keyword_DV'], "DV")
-        add_keyword(fields['keyword_IV'], "IV")
-        add_keyword(fields['keyword_method_case'], "method_case")
+            # Add new keywords to the pool, committed together with the entry
+            new_keywords = add_keywords(c, [
+                (fields['keyword_DV'], "DV"),
+                (fields['keyword_IV'], "IV"),
+                (fields['keyword_method_case'], "method_case"),
+            ])
+            conn.commit()
 
-    except sqlite3.IntegrityError:
-        st.warning("This Zotero item is already in the database!")
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            st.warning("This Zotero item is already in the database!")
+            return
+
+    if new_keywords:
+        get_keywords.clear()
+    st.success("Entry saved successfully!")
+
+def search_entries(query, limit=50):
+    """Ranked full-text search over the notes; returns (zotero_key, title, authors, year, snippet) rows"""
+    sql = '''
+        SELECT l.zotero_key, l.title, l.authors, l.year,
+               snippet(literature_fts, -1, '**', '**', ' … ', 16)
+        FROM literature_fts JOIN literature l ON l.id = literature_fts.rowid
+        WHERE literature_fts MATCH ?
+        ORDER BY bm25(literature_fts)
+        LIMIT ?
+    '''
+    with get_pool().connection() as conn:
+        try:
+            return conn.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 query syntax, so search for the words as plain terms
+            terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+            return conn.execute(sql, (terms, limit)).fetchall()
 
 # --- STREAMLIT GUI ---
 
 st.title("📚 Literature Database with Zotero Integration")
 
-# Step 1: Fetch Zotero items
-zotero_items = fetch_zotero_items_full()
+# Search the notes of saved entries
+if FTS_AVAILABLE:
+    with st.expander("🔎 Search literature notes"):
+        search_query = st.text_input("Search terms (supports AND, OR, NOT, \"phrases\" and prefix*)")
+        if search_query.strip():
+            hits = search_entries(search_query.strip())
+            if not hits:
+                st.info("No matching entries.")
+            for hit_key, hit_title, hit_authors, hit_year, hit_snippet in hits:
+                st.markdown(f"**{hit_title}** ({hit_authors}, {hit_year})  \n{hit_snippet}")
+
+# Step 1: Load Zotero items from the local mirror
+force_sync = st.sidebar.button("🔄 Sync with Zotero")
+zotero_items = fetch_zotero_items_full(force_sync)
 if not zotero_items:
     st.info("No Zotero items found. Check API key and User ID.")
 else:
@@ -159,48 +476,60 @@ else:
         meta = zotero_items[selected]
         zotero_key = meta["zotero_key"]
 
+        # Items that were saved before are edited instead of added again
+        saved = get_entry(zotero_key)
+        if saved:
+            st.info(f"✏️ Editing saved entry (last updated {saved['timestamp_updated']})")
+        else:
+            saved = {}
+
+        def keyword_index(options, column):
+            return options.index(saved[column]) if saved.get(column) in options else 0
+
         # --- Autofill bibliographic info ---
         st.subheader("Bibliographic Info")
-        authors = st.text_input("Authors", value=meta["authors"])
-        title = st.text_input("Title", value=meta["title"])
-        journal = st.text_input("Journal", value=meta["journal"])
-        year = st.number_input("Year", value=int(meta["year"].split("-")[0]) if meta["year"] else 2026)
-        book_press = st.text_input("Book Press", value=meta["book_press"])
-        institutions = st.text_input("Institutions (optional)")
+        authors = st.text_input("Authors", value=saved.get("authors", meta["authors"]))
+        title = st.text_input("Title", value=saved.get("title", meta["title"]))
+        journal = st.text_input("Journal", value=saved.get("journal", meta["journal"]))
+        default_year = int(meta["year"].split("-")[0]) if meta["year"] else 2026
+        year = st.number_input("Year", value=saved.get("year") or default_year)
+        book_press = st.text_input("Book Press", value=saved.get("book_press", meta["book_press"]))
+        institutions = st.text_input("Institutions (optional)", value=saved.get("institutions", ""))
 
         # --- Keywords ---
         st.subheader("Keywords")
 
         # DV keyword
         dv_options = ["<New Keyword>"] + get_keywords("DV")
-        keyword_DV = st.selectbox("Keyword DV/Topic", dv_options)
+        keyword_DV = st.selectbox("Keyword DV/Topic", dv_options, index=keyword_index(dv_options, "keyword_DV"))
         if keyword_DV == "<New Keyword>":
             keyword_DV = st.text_input("Enter new DV keyword")
 
         # IV keyword
         iv_options = ["<New Keyword>"] + get_keywords("IV")
-        keyword_IV = st.selectbox("Keyword IV", iv_options)
+        keyword_IV = st.selectbox("Keyword IV", iv_options, index=keyword_index(iv_options, "keyword_IV"))
         if keyword_IV == "<New Keyword>":
             keyword_IV = st.text_input("Enter new IV keyword")
 
         # Method/Case keyword
         method_options = ["<New Keyword>"] + get_keywords("method_case")
-        keyword_method_case = st.selectbox("Keyword Method/Case", method_options)
+        keyword_method_case = st.selectbox("Keyword Method/Case", method_options,
+                                           index=keyword_index(method_options, "keyword_method_case"))
         if keyword_method_case == "<New Keyword>":
             keyword_method_case = st.text_input("Enter new Method/Case keyword")
 
         # --- Analysis ---
         st.subheader("Analysis")
-        argument = st.text_area("Argument")
-        method = st.text_area("Method")
-        evidence = st.text_area("Evidence")
-        implication = st.text_area("Implication")
-        further_research = st.text_area("Further Research")
+        argument = st.text_area("Argument", value=saved.get("argument", ""))
+        method = st.text_area("Method", value=saved.get("method", ""))
+        evidence = st.text_area("Evidence", value=saved.get("evidence", ""))
+        implication = st.text_area("Implication", value=saved.get("implication", ""))
+        further_research = st.text_area("Further Research", value=saved.get("further_research", ""))
 
         # --- Personal Thoughts ---
         st.subheader("Personal Thoughts")
-        happy_thoughts = st.text_area("Susana's Happy Thoughts")
-        unhappy_thoughts = st.text_area("Susana's Unhappy Thoughts")
+        happy_thoughts = st.text_area("Susana's Happy Thoughts", value=saved.get("happy_thoughts", ""))
+        unhappy_thoughts = st.text_area("Susana's Unhappy Thoughts", value=saved.get("unhappy_thoughts", ""))
 
         # --- Save Entry ---
         if st.button("Save Entry"):
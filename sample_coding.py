@@ -1,64 +1,975 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import atexit
+import csv
+import hashlib
+import io
+import json
+import os
+import queue
+import re
 import sqlite3
+import tempfile
+import threading
+import time
 from datetime import datetime
 
+from annotation_analytics import AnnotationStats
+
+# Uploads at least this large are also spilled to Parquet, so reloading them skips the CSV parser
+PARQUET_SPILL_BYTES = 50 * 1024 * 1024
+
 # --------------------------
 # Database functions
 # --------------------------
 
-def save_label(db_path, entry_id, entry_text, variable_labels, table_name="annotations"):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+# Write-behind settings: queued annotations are committed together once a batch
+# has this many records or its first record has waited this long
+WRITE_BATCH_SIZE = 50
+WRITE_FLUSH_SECONDS = 0.5
+
+# Rows fetched from the database per step when exporting
+EXPORT_CHUNK_ROWS = 5000
+
+# Storage engines: one column per variable, or one (entry, variable, coder) row per value
+STORAGE_WIDE = "wide"
+STORAGE_LONG = "long"
+
+# Work leasing: a coder holds up to LEASE_BATCH entries, each for LEASE_SECONDS
+# after it was last handed out, so coders sharing a database never get the same entry
+LEASE_BATCH = 20
+LEASE_SECONDS = 15 * 60
+
+# Leases are only rewritten once one has less than LEASE_RENEW_SECONDS left or the
+# coder holds fewer than LEASE_REFILL entries; other reruns just read them back
+LEASE_RENEW_SECONDS = 5 * 60
+LEASE_REFILL = 10
+
+# Double coding picks entries by a hash of their id, in steps of 1 / DOUBLE_CODING_BUCKETS
+DOUBLE_CODING_BUCKETS = 10_000
+
+# Window for the per-coder throughput shown in the sidebar
+THROUGHPUT_WINDOW_SECONDS = 3600
+
+
+class AnnotationDB:
+    """Shared connection to an annotation database, with the table columns cached"""
+
+    def __init__(self, db_path):
+        # sqlite3 keeps compiled statements per connection, so repeated INSERTs reuse them
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.columns = {}  # table name -> column names, None if the table does not exist
+        self.variables = {}  # long-format table name -> variables stored in it
+        self.indexed = set()  # wide tables whose timestamp index is known to exist
+
+    def table_columns(self, table_name):
+        if table_name not in self.columns:
+            info = self.conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+            self.columns[table_name] = [col[1] for col in info] or None
+        return self.columns[table_name]
+
+
+@st.cache_resource
+def open_handles():
+    """Connections and writers opened so far, by database path, so they can be closed without creating one"""
+    return {"db": {}, "writer": {}}
 
-    # Check table
-    c.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-    if not c.fetchone():
-        cols_sql = ", ".join([f"{var} TEXT" for var in variable_labels.keys()])
-        c.execute(
+
+@st.cache_resource
+def get_db(db_path):
+    db = AnnotationDB(db_path)
+    open_handles()["db"][db_path] = db
+    return db
+
+
+def ensure_table(db, table_name, variables):
+    """Create the table or add missing variable columns (only hits the database when the schema changes)"""
+    existing_cols = db.table_columns(table_name)
+    if existing_cols is None:
+        cols_sql = ", ".join([f"{var} TEXT" for var in variables])
+        db.conn.execute(
             f"""
             CREATE TABLE {table_name} (
                 id TEXT PRIMARY KEY,
                 text TEXT,
                 timestamp TEXT,
+                coder TEXT,
+                version INTEGER NOT NULL DEFAULT 0,
                 {cols_sql}
             )
             """
         )
+        db.columns[table_name] = ["id", "text", "timestamp", "coder", "version"] + list(variables)
     else:
-        c.execute(f"PRAGMA table_info({table_name})")
-        existing_cols = [info[1] for info in c.fetchall()]
-        for col in ["timestamp"] + list(variable_labels.keys()):
+        if "version" not in existing_cols:
+            db.conn.execute(f"ALTER TABLE {table_name} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            existing_cols.append("version")
+        for col in ["timestamp", "coder"] + list(variables):
             if col not in existing_cols:
-                c.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} TEXT")
+                db.conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} TEXT")
+                existing_cols.append(col)
+    if table_name not in db.indexed:
+        # The analytics read only the rows saved since their last refresh
+        db.conn.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_timestamp ON {table_name} (timestamp)")
+        db.indexed.add(table_name)
 
-    timestamp = datetime.utcnow().isoformat()
 
-    columns = ["id", "text", "timestamp"] + list(variable_labels.keys())
-    placeholders = ", ".join("?" for _ in columns)
-    values = [entry_id, entry_text, timestamp] + list(variable_labels.values())
+def ensure_long_tables(db, table_name, variables):
+    """Create the long-format tables and keep the pivot view in line with the variables in use"""
+    values_table = f"{table_name}_values"
+    known = db.variables.get(values_table)
+    if known is None:
+        db.conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name}_entries (id TEXT PRIMARY KEY, text TEXT)")
+        db.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {values_table} (
+                entry_id TEXT NOT NULL,
+                variable TEXT NOT NULL,
+                value TEXT,
+                coder TEXT NOT NULL DEFAULT '',
+                timestamp TEXT,
+                version INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (entry_id, variable, coder)
+            )
+            """
+        )
+        db.conn.execute(f"CREATE INDEX IF NOT EXISTS {values_table}_variable ON {values_table} (variable, value)")
+        db.conn.execute(f"CREATE INDEX IF NOT EXISTS {values_table}_timestamp ON {values_table} (timestamp)")
+        db.columns.pop(values_table, None)
+        db.columns.pop(f"{table_name}_entries", None)
+        if "version" not in db.table_columns(values_table):
+            db.conn.execute(f"ALTER TABLE {values_table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            db.columns.pop(values_table)
+        known = [row[0] for row in db.conn.execute(f"SELECT DISTINCT variable FROM {values_table}")]
+        db.variables[values_table] = known
+        new_variables = True
+    else:
+        new_variables = False
+
+    for var in variables:
+        if var not in known:
+            known.append(var)
+            new_variables = True
+    if new_variables:
+        cases = "".join(
+            f", MAX(CASE WHEN v.variable = '{var}' THEN v.value END) AS {var}" for var in known
+        )
+        db.conn.execute(f"DROP VIEW IF EXISTS {table_name}_pivot")
+        db.conn.execute(
+            f"""
+            CREATE VIEW {table_name}_pivot AS
+            SELECT e.id, e.text, v.coder, MAX(v.timestamp) AS timestamp{cases}
+            FROM {values_table} v JOIN {table_name}_entries e ON e.id = v.entry_id
+            GROUP BY e.id, v.coder
+            """
+        )
+
+
+def ensure_lease_table(db):
+    if db.table_columns("leases") is None:
+        db.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                entry_id TEXT PRIMARY KEY,
+                coder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        db.conn.execute("CREATE INDEX IF NOT EXISTS leases_coder ON leases (coder, expires_at)")
+        db.columns["leases"] = ["entry_id", "coder", "expires_at"]
+
+
+def read_version(db, entry_id, table_name="annotations", storage=STORAGE_WIDE, coder=""):
+    """Current version of an entry's annotation (0 if it has none); the caller holds db.lock"""
+    if storage == STORAGE_LONG:
+        # Coders have their own rows in long format, so each coder's labels are versioned separately
+        if db.table_columns(f"{table_name}_values") is None:
+            return 0
+        row = db.conn.execute(
+            f"SELECT MAX(version) FROM {table_name}_values WHERE entry_id = ? AND coder = ?",
+            (entry_id, coder)
+        ).fetchone()
+    else:
+        columns = db.table_columns(table_name)
+        if columns is None or "version" not in columns:
+            return 0
+        row = db.conn.execute(f"SELECT version FROM {table_name} WHERE id = ?", (entry_id,)).fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def write_annotations(db, records, table_name="annotations", storage=STORAGE_WIDE):
+    """Write (id, text, timestamp, labels, coder, expected_version) records in a single transaction.
+
+    A record whose entry has moved past its expected version (someone else saved
+    it in the meantime) is skipped rather than overwritten; the ids of skipped
+    records are returned. An expected version of None always writes.
+    """
+    with db.lock:
+        variables = list(dict.fromkeys(var for record in records for var in record[3]))
+        # IMMEDIATE takes the write lock up front, so the version checks hold until commit
+        db.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if storage == STORAGE_LONG:
+                ensure_long_tables(db, table_name, variables)
+            else:
+                ensure_table(db, table_name, variables)
+
+            accepted = []
+            conflicts = []
+            for entry_id, entry_text, timestamp, variable_labels, coder, expected in records:
+                version = read_version(db, entry_id, table_name, storage, coder)
+                if expected is not None and version != expected:
+                    conflicts.append(entry_id)
+                    continue
+                accepted.append((entry_id, entry_text, timestamp, variable_labels, coder, version + 1))
+
+            if storage == STORAGE_LONG:
+                db.conn.executemany(
+                    f"INSERT OR REPLACE INTO {table_name}_entries (id, text) VALUES (?, ?)",
+                    [(entry_id, entry_text) for entry_id, entry_text, *_ in accepted]
+                )
+                # Each value is its own row, so changing one variable touches one row
+                db.conn.executemany(
+                    f"""
+                    INSERT INTO {table_name}_values (entry_id, variable, value, coder, timestamp, version)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (entry_id, variable, coder)
+                    DO UPDATE SET value = excluded.value, timestamp = excluded.timestamp,
+                                  version = excluded.version
+                    """,
+                    [
+                        (entry_id, var, value, coder, timestamp, version)
+                        for entry_id, _, timestamp, variable_labels, coder, version in accepted
+                        for var, value in variable_labels.items()
+                    ]
+                )
+            else:
+                # One executemany per distinct set of variables
+                groups = {}
+                for entry_id, entry_text, timestamp, variable_labels, coder, version in accepted:
+                    groups.setdefault(tuple(variable_labels), []).append(
+                        [entry_id, entry_text, timestamp, coder, version] + list(variable_labels.values())
+                    )
+                for variable_names, rows in groups.items():
+                    columns = ["id", "text", "timestamp", "coder", "version"] + list(variable_names)
+                    placeholders = ", ".join("?" for _ in columns)
+                    db.conn.executemany(
+                        f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
+                        rows
+                    )
+
+            # A saved entry no longer needs its lease
+            if db.table_columns("leases") is not None:
+                db.conn.executemany(
+                    "DELETE FROM leases WHERE entry_id = ? AND coder = ?",
+                    [(entry_id, coder) for entry_id, _, _, _, coder, _ in accepted]
+                )
+            db.conn.commit()
+        except BaseException:
+            db.conn.rollback()
+            # Schema changes made in this transaction were rolled back too
+            db.columns.clear()
+            db.variables.clear()
+            db.indexed.clear()
+            raise
+        return conflicts
+
+
+class AnnotationWriter:
+    """Background thread that commits queued annotations in batched transactions"""
+
+    def __init__(self, db, batch_size=WRITE_BATCH_SIZE, flush_seconds=WRITE_FLUSH_SECONDS):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue()
+        self.errors = []
+        # Batches that could not be written; sessions reload their annotated ids when it changes
+        self.failed_batches = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # Make sure nothing that was queued is lost when the server shuts down
+        atexit.register(self.close)
+
+    def submit(self, table_name, storage, record):
+        self.queue.put((table_name, storage, record))
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            tables = {}
+            for item in batch:
+                if item is not None:
+                    tables.setdefault(item[:2], []).append(item[2])
+            try:
+                for (table_name, storage), records in tables.items():
+                    try:
+                        conflicts = self._write(records, table_name, storage)
+                    except Exception as e:
+                        self.errors.append(f"{len(records)} annotation(s) could not be saved: {e}")
+                        self.failed_batches += 1
+                        continue
+                    for entry_id in conflicts:
+                        self.errors.append(
+                            f"ID {entry_id} was saved by someone else after you opened it; your labels were not saved"
+                        )
+            finally:
+                # flush() waits on these, so they must be marked done whatever happened
+                for _ in batch:
+                    self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, records, table_name, storage):
+        """write_annotations, tried once more if it fails (e.g. the database stayed locked)"""
+        try:
+            return write_annotations(self.db, records, table_name, storage)
+        except Exception:
+            return write_annotations(self.db, records, table_name, storage)
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        self.queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+
+@st.cache_resource
+def get_writer(db_path):
+    writer = AnnotationWriter(get_db(db_path))
+    open_handles()["writer"][db_path] = writer
+    return writer
+
 
-    c.execute(
-        f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
-        values
+@st.cache_resource
+def get_stats(db_path, storage=STORAGE_WIDE):
+    """Analytics kept in memory across reruns, so each refresh only reads new annotations"""
+    return AnnotationStats(db_path, storage=storage)
+
+
+def release_db(db_path):
+    """Flush and drop the cached connection, writer and analytics of one database, e.g. before it is replaced"""
+    handles = open_handles()
+    writer = handles["writer"].pop(db_path, None)
+    if writer:
+        writer.close()
+    db = handles["db"].pop(db_path, None)
+    if db:
+        db.conn.close()
+    get_writer.clear(db_path)
+    get_db.clear(db_path)
+    for storage in (STORAGE_WIDE, STORAGE_LONG):
+        get_stats.clear(db_path, storage)
+
+
+def save_label(db_path, entry_id, entry_text, variable_labels, table_name="annotations",
+               storage=STORAGE_WIDE, coder="", expected_version=None):
+    """Queue an annotation; it is committed by the background writer shortly after.
+
+    Pass the version the entry had when it was opened (see get_version) to have
+    the save dropped if another coder saved the entry first.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    get_writer(db_path).submit(
+        table_name, storage,
+        (entry_id, entry_text, timestamp, dict(variable_labels), coder, expected_version)
     )
 
-    conn.commit()
-    conn.close()
 
+def get_version(db_path, entry_id, table_name="annotations", storage=STORAGE_WIDE, coder=""):
+    db = get_db(db_path)
+    with db.lock:
+        return read_version(db, entry_id, table_name, storage, coder)
+
+
+def double_coded(entry_ids, share):
+    """Which entries a second coder also annotates: a fixed share, picked by a hash of the id.
+
+    The pick only depends on the id, so every coder's app agrees on it without
+    storing anything.
+    """
+    if not share:
+        return np.zeros(len(entry_ids), dtype=bool)
+    hashes = pd.util.hash_array(np.asarray(entry_ids, dtype=object).astype(str))
+    return hashes % DOUBLE_CODING_BUCKETS < round(share * DOUBLE_CODING_BUCKETS)
+
+
+def lease_entries(db_path, coder, candidate_ids, table_name="annotations", storage=STORAGE_WIDE,
+                  batch=LEASE_BATCH, lease_seconds=LEASE_SECONDS, renew_seconds=LEASE_RENEW_SECONDS,
+                  refill=LEASE_REFILL, double_share=0.0, queued=None):
+    """Hand a coder up to `batch` entries and return (leased ids, ids found already annotated).
+
+    Only the coder's leases on entries that are still candidates count; the
+    others (e.g. from another file, or lost to a version conflict) are given
+    up. queued maps a list of ids to a boolean array of which are candidates;
+    without it, candidate_ids is read into a set.
+
+    While the coder holds at least `refill` such leases and none expires within
+    renew_seconds, they are returned as they are. Otherwise they are renewed
+    and topped up from candidate_ids (any iterable, consumed only as far as
+    needed), skipping entries another coder holds a live lease on or that were
+    annotated since the caller loaded its list of annotated ids.
+    With double_share (long storage only), that share of the entries stays
+    open until a second coder has annotated it too.
+    """
+    if queued is None:
+        candidate_ids = list(candidate_ids)
+        candidate_set = set(candidate_ids)
+
+        def queued(ids):
+            return np.array([entry_id in candidate_set for entry_id in ids], dtype=bool)
+
+    if storage == STORAGE_LONG and double_share:
+        annotated_table = f"{table_name}_values"
+        done_query = f"""
+            SELECT COUNT(DISTINCT coder) >= ? OR COALESCE(MAX(coder = ?), 0)
+            FROM {annotated_table} WHERE entry_id = ?
+        """
+
+        def done_params(entry_id):
+            return (2 if double_coded([entry_id], double_share)[0] else 1, coder, entry_id)
+    else:
+        annotated_table = f"{table_name}_entries" if storage == STORAGE_LONG else table_name
+        done_query = f"SELECT EXISTS (SELECT 1 FROM {annotated_table} WHERE id = ?)"
+
+        def done_params(entry_id):
+            return (entry_id,)
+
+    db = get_db(db_path)
+    now = time.time()
+    with db.lock:
+        ensure_lease_table(db)
+        # Most reruns find the leases fine as they are and need no write transaction
+        current = db.conn.execute(
+            "SELECT entry_id, expires_at FROM leases WHERE coder = ? AND expires_at > ?", (coder, now)
+        ).fetchall()
+        renew_by = now + renew_seconds
+        fresh = all(expires > renew_by for _, expires in current)
+        if current and fresh and len(current) >= min(refill, batch) and queued([c[0] for c in current]).all():
+            return [entry_id for entry_id, _ in current], []
+
+        db.conn.execute("BEGIN IMMEDIATE")
+        try:
+            db.conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+            held = dict(db.conn.execute("SELECT entry_id, coder FROM leases"))
+            mine = [entry_id for entry_id, holder in held.items() if holder == coder]
+            # Leases on entries that left the queue would otherwise block them for everyone
+            in_queue = queued(mine)
+            db.conn.executemany(
+                "DELETE FROM leases WHERE entry_id = ? AND coder = ?",
+                [(entry_id, coder) for entry_id, keep in zip(mine, in_queue) if not keep]
+            )
+            mine = [entry_id for entry_id, keep in zip(mine, in_queue) if keep]
+            annotated = []
+            check_annotated = db.table_columns(annotated_table) is not None
+
+            for entry_id in candidate_ids:
+                if len(mine) >= batch:
+                    break
+                if entry_id in held:
+                    continue
+                if check_annotated and db.conn.execute(done_query, done_params(entry_id)).fetchone()[0]:
+                    annotated.append(entry_id)
+                    continue
+                mine.append(entry_id)
+
+            db.conn.executemany(
+                "INSERT OR REPLACE INTO leases (entry_id, coder, expires_at) VALUES (?, ?, ?)",
+                [(entry_id, coder, now + lease_seconds) for entry_id in mine]
+            )
+            db.conn.commit()
+        except BaseException:
+            db.conn.rollback()
+            raise
+    return mine, annotated
+
+
+def coder_throughput(db_path, table_name="annotations", storage=STORAGE_WIDE,
+                     window_seconds=THROUGHPUT_WINDOW_SECONDS):
+    """Per-coder totals, entries saved within the window, and entries currently leased"""
+    db = get_db(db_path)
+    since = datetime.utcfromtimestamp(time.time() - window_seconds).isoformat()
+    with db.lock:
+        if storage == STORAGE_LONG:
+            table = f"{table_name}_values"
+            query = f"""
+                SELECT coder, COUNT(DISTINCT entry_id) AS annotated,
+                       COUNT(DISTINCT CASE WHEN timestamp >= ? THEN entry_id END) AS recent
+                FROM {table} GROUP BY coder
+            """
+        else:
+            table = table_name
+            query = f"""
+                SELECT COALESCE(coder, '') AS coder, COUNT(*) AS annotated,
+                       SUM(timestamp >= ?) AS recent
+                FROM {table} GROUP BY COALESCE(coder, '')
+            """
+        columns = db.table_columns(table)
+        if columns is None or "coder" not in columns:
+            stats = pd.DataFrame(columns=["coder", "annotated", "recent"])
+        else:
+            stats = pd.read_sql(query, db.conn, params=(since,))
+        if db.table_columns("leases") is not None:
+            leased = pd.read_sql(
+                "SELECT coder, COUNT(*) AS leased FROM leases WHERE expires_at > ? GROUP BY coder",
+                db.conn, params=(time.time(),)
+            )
+            stats = stats.merge(leased, on="coder", how="outer")
+    stats = stats.fillna(0)
+    counts = [col for col in stats.columns if col != "coder"]
+    stats[counts] = stats[counts].astype(int)
+    minutes = window_seconds // 60
+    return stats.rename(columns={"recent": f"last {minutes} min"}).sort_values("annotated", ascending=False)
+
+
+def get_all_entries(db_path, table_name="annotations", storage=STORAGE_WIDE):
+    db = get_db(db_path)
+    with db.lock:
+        if storage == STORAGE_LONG:
+            if db.table_columns(f"{table_name}_values") is None:
+                return pd.DataFrame()
+            ensure_long_tables(db, table_name, [])
+            return pd.read_sql(f"SELECT * FROM {table_name}_pivot", db.conn)
+        if db.table_columns(table_name) is None:
+            return pd.DataFrame()
+        return pd.read_sql(f"SELECT * FROM {table_name}", db.conn)
+
+
+def get_annotated_ids(db_path, table_name="annotations", storage=STORAGE_WIDE, coder="", double_share=0.0):
+    """Return the ids that already have an annotation, without reading any text.
+
+    With double_share (long storage only), a double-coded entry counts as done
+    once two coders annotated it, or once `coder` did.
+    """
+    db = get_db(db_path)
+    with db.lock:
+        if storage == STORAGE_LONG and double_share:
+            values_table = f"{table_name}_values"
+            if db.table_columns(values_table) is None:
+                return set()
+            coded = pd.read_sql(
+                f"SELECT entry_id, COUNT(DISTINCT coder) AS coders, MAX(coder = ?) AS mine "
+                f"FROM {values_table} GROUP BY entry_id",
+                db.conn, params=(coder,)
+            )
+            needed = np.where(double_coded(coded["entry_id"], double_share), 2, 1)
+            done = (coded["mine"] > 0) | (coded["coders"] >= needed)
+            return set(coded["entry_id"][done].astype(str))
+        if storage == STORAGE_LONG:
+            table_name = f"{table_name}_entries"
+        if db.table_columns(table_name) is None:
+            return set()
+        # Answered from the primary key index alone
+        return {str(row[0]) for row in db.conn.execute(f"SELECT id FROM {table_name}")}
+
+
+def export_annotations(db_path, export_path, export_format="csv", table_name="annotations",
+                       storage=STORAGE_WIDE, progress=None):
+    """Stream all annotations into a CSV, JSONL or Parquet file and return the row count.
+
+    Rows are fetched in chunks of EXPORT_CHUNK_ROWS over a separate connection,
+    so memory stays bounded and saves are not blocked while the export runs.
+    """
+    db = get_db(db_path)
+    with db.lock:
+        if storage == STORAGE_LONG:
+            if db.table_columns(f"{table_name}_values") is None:
+                return 0
+            ensure_long_tables(db, table_name, [])
+            query = f"SELECT * FROM {table_name}_pivot"
+        else:
+            if db.table_columns(table_name) is None:
+                return 0
+            query = f"SELECT * FROM {table_name}"
 
-def get_all_entries(db_path, table_name="annotations"):
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-    if not c.fetchone():
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+        cursor = conn.execute(query)
+        columns = [col[0] for col in cursor.description]
+
+        if export_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([(col, pa.string()) for col in columns])
+            out = pq.ParquetWriter(export_path, schema)
+        else:
+            out = open(export_path, "w", newline="", encoding="utf-8")
+            if export_format == "csv":
+                csv_writer = csv.writer(out)
+                csv_writer.writerow(columns)
+
+        done = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                if export_format == "parquet":
+                    chunk = {
+                        col: [None if row[i] is None else str(row[i]) for row in rows]
+                        for i, col in enumerate(columns)
+                    }
+                    out.write_table(pa.Table.from_pydict(chunk, schema=schema))
+                elif export_format == "jsonl":
+                    out.writelines(
+                        json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows
+                    )
+                else:
+                    csv_writer.writerows(rows)
+                done += len(rows)
+                if progress:
+                    progress(done, total)
+        finally:
+            out.close()
+        return done
+    finally:
         conn.close()
-        return pd.DataFrame()
-    df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-    conn.close()
+
+
+def export_reader(export_path):
+    """Callable for st.download_button, so an export is only read from disk when it is downloaded"""
+    def read():
+        with open(export_path, "rb") as f:
+            return f.read()
+    return read
+
+
+# --------------------------
+# Upload handling
+# --------------------------
+
+def upload_hash(uploaded_file):
+    """Content hash of an uploaded file, computed once per upload"""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = hashlib.blake2b(
+            uploaded_file.getbuffer(), digest_size=16
+        ).hexdigest()
+    return hashes[uploaded_file.file_id]
+
+
+@st.cache_resource(max_entries=4, show_spinner="Parsing CSV...")
+def load_csv(content_hash, _data):
+    """Parse an uploaded CSV once per distinct file content (the frame must not be modified)"""
+    spill_path = os.path.join(tempfile.gettempdir(), f"upload_{content_hash}.parquet")
+    if os.path.exists(spill_path):
+        return pd.read_parquet(spill_path)
+
+    df = pd.read_csv(io.BytesIO(_data))
+    if len(_data) >= PARQUET_SPILL_BYTES:
+        # Written under a temporary name, so a failed write never leaves a partial spill behind
+        tmp_path = f"{spill_path}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, spill_path)
+        except (ImportError, ValueError, TypeError, NotImplementedError, OSError):
+            # No Parquet engine, or columns it cannot store (e.g. numbers mixed with text
+            # by a chunked read): keep the in-memory cache only
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
     return df
 
 
+# Queue entries sliced ahead of the cursor, so the next renders are plain lookups
+PREFETCH_ENTRIES = 20
+
+
+@st.cache_resource(max_entries=4)
+def column_arrays(content_hash, id_column, text_column, _df):
+    """Ids (as strings), texts and an id lookup index for an uploaded file, built once per column choice"""
+    ids = _df[id_column].astype(str).to_numpy()
+    return ids, _df[text_column].to_numpy(), pd.Index(ids)
+
+
+def prefetch_entries(positions, start, ids, texts, count=PREFETCH_ENTRIES):
+    """Map the row positions of `count` queue entries from `start` on to their (id, text)"""
+    window = positions[start:start + count]
+    return dict(zip(window.tolist(), zip(ids[window].tolist(), texts[window].tolist())))
+
+
+# --------------------------
+# Variable schema
+# --------------------------
+
+CONDITION_PATTERN = re.compile(r"^(\w+)\s*(!=|=|\bnot in\b|\bin\b)\s*(.+)$")
+
+
+def parse_condition(condition):
+    """Compile 'a=x and b in y,z or c!=w' into OR-groups of AND-ed (variable, op, values) tests"""
+    groups = []
+    for group in re.split(r"\s+or\s+", condition.strip()):
+        tests = []
+        for test in re.split(r"\s+and\s+", group.strip()):
+            match = CONDITION_PATTERN.match(test.strip())
+            if not match:
+                raise ValueError(f"Cannot read condition '{test.strip()}'")
+            parent, op, values = match.groups()
+            values = frozenset(v.strip() for v in values.strip("() ").split(","))
+            tests.append((parent, op, values))
+        groups.append(tuple(tests))
+    return tuple(groups)
+
+
+def condition_met(condition, values):
+    """Evaluate a compiled condition against the values chosen so far"""
+    if not condition:
+        return True
+    for group in condition:
+        for parent, op, allowed in group:
+            value = values.get(parent)
+            if op in ("=", "in"):
+                if value not in allowed:
+                    break
+            elif value is None or value in allowed:
+                break
+        else:
+            return True
+    return False
+
+
+@st.cache_data
+def compile_schema(var_input):
+    """Parse the variable definitions once and order them so parents come before children"""
+    variables = {}
+    for line in var_input.strip().splitlines():
+        if ":" not in line:
+            continue
+
+        var_part, labels_part = line.split(":", 1)
+        var_name = var_part.strip()
+        if var_name in variables:
+            raise ValueError(f"Variable '{var_name}' is defined twice")
+
+        # Only a standalone 'if' starts the condition, so labels like 'life' are safe
+        parts = re.split(r"\s+if\s+", labels_part.strip(), maxsplit=1)
+        labels = parts[0].strip()
+        condition = parse_condition(parts[1]) if len(parts) > 1 else None
+        variables[var_name] = {
+            "name": var_name,
+            "type": "TEXT" if labels.upper() == "TEXT" else [l.strip() for l in labels.split(",")],
+            "condition": condition,
+            "parents": sorted({test[0] for group in condition or () for test in group}),
+        }
+
+    # Topological order: parents first, otherwise in the order they were declared
+    ordered = []
+    state = {}
+
+    def visit(var):
+        if state.get(var["name"]) == "done":
+            return
+        if state.get(var["name"]) == "visiting":
+            raise ValueError(f"Circular conditions involving '{var['name']}'")
+        state[var["name"]] = "visiting"
+        for parent in var["parents"]:
+            if parent not in variables:
+                raise ValueError(f"'{var['name']}' depends on unknown variable '{parent}'")
+            visit(variables[parent])
+        state[var["name"]] = "done"
+        ordered.append(var)
+
+    for var in variables.values():
+        visit(var)
+    return ordered
+
+
+# --------------------------
+# Pre-annotation
+# --------------------------
+
+# A variable needs this many saved labels before a model is trained for it
+SUGGEST_MIN_EXAMPLES = 10
+# Texts classified per step when suggesting labels for the queue
+SUGGEST_CHUNK_ROWS = 10000
+
+RULE_PATTERN = re.compile(r"^(\w+)\s*=\s*([^:]+):(.+)$")
+
+
+def parse_keyword_rules(rules_input):
+    """Compile 'variable=label: keyword, keyword' lines into {variable: {label: regex}}"""
+    rules = {}
+    for line in rules_input.strip().splitlines():
+        if not line.strip():
+            continue
+        match = RULE_PATTERN.match(line.strip())
+        if not match:
+            raise ValueError(f"Cannot read rule '{line.strip()}'")
+        variable, label, keywords = (part.strip() for part in match.groups())
+        words = [re.escape(word.strip()) for word in keywords.split(",") if word.strip()]
+        if not words:
+            raise ValueError(f"Rule '{line.strip()}' has no keywords")
+        # Lookarounds rather than \b, so keywords that start or end with a symbol (c++, #tag) still match
+        rules.setdefault(variable, {})[label] = r"(?<!\w)(?:" + "|".join(words) + r")(?!\w)"
+    return rules
+
+
+class KeywordSuggester:
+    """Suggests the label whose keywords occur in the text.
+
+    The confidence is split evenly when the keywords of several labels occur;
+    texts without any keyword get no suggestion.
+    """
+
+    name = "keywords"
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def predict(self, texts):
+        texts = pd.Series(texts, dtype=object).fillna("").astype(str)
+        predictions = {}
+        for variable, labels in self.rules.items():
+            hits = pd.DataFrame({
+                label: texts.str.contains(pattern, case=False, regex=True).to_numpy()
+                for label, pattern in labels.items()
+            })
+            counts = hits.sum(axis=1).to_numpy()
+            first = hits.to_numpy().argmax(axis=1)
+            suggested = np.where(counts > 0, np.array(list(labels), dtype=object)[first], None)
+            confidence = np.where(counts > 0, 1.0 / np.maximum(counts, 1), np.nan)
+            predictions[variable] = (suggested, confidence)
+        return predictions
+
+
+class ModelSuggester:
+    """TF-IDF + logistic regression per variable, trained on the annotations saved so far (CPU only)"""
+
+    name = "model"
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.vectorizer = TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2), min_df=2, max_features=100000)
+        self.models = {}
+
+    def fit(self, texts, labels):
+        """Train on saved texts; labels maps each variable to its values (None where unset)"""
+        from sklearn.linear_model import LogisticRegression
+        texts = pd.Series(texts, dtype=object).fillna("").astype(str)
+        features = self.vectorizer.fit_transform(texts)
+        for variable, values in labels.items():
+            values = pd.Series(values, dtype=object)
+            known = values.notna().to_numpy() & (values.astype(str) != "").to_numpy()
+            if known.sum() < SUGGEST_MIN_EXAMPLES or values[known].nunique() < 2:
+                continue
+            model = LogisticRegression(max_iter=1000)
+            model.fit(features[known], values[known].astype(str))
+            self.models[variable] = model
+        return self
+
+    def predict(self, texts):
+        features = self.vectorizer.transform(pd.Series(texts, dtype=object).fillna("").astype(str))
+        predictions = {}
+        for variable, model in self.models.items():
+            probabilities = model.predict_proba(features)
+            best = probabilities.argmax(axis=1)
+            predictions[variable] = (model.classes_[best].astype(object), probabilities.max(axis=1))
+        return predictions
+
+
+def train_suggester(db_path, variables, table_name="annotations", storage=STORAGE_WIDE):
+    """Fit a ModelSuggester on the saved annotations of the categorical variables"""
+    get_writer(db_path).flush()
+    saved = get_all_entries(db_path, table_name, storage)
+    categorical = [var["name"] for var in variables if var["type"] != "TEXT" and var["name"] in saved]
+    if saved.empty or not categorical:
+        return ModelSuggester()
+    return ModelSuggester().fit(saved["text"], {var: saved[var] for var in categorical})
+
+
+def ensure_suggestion_table(db, table_name):
+    table = f"{table_name}_suggestions"
+    if db.table_columns(table) is None:
+        db.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                entry_id TEXT NOT NULL,
+                variable TEXT NOT NULL,
+                label TEXT,
+                confidence REAL,
+                model TEXT,
+                PRIMARY KEY (entry_id, variable)
+            )
+            """
+        )
+        db.columns[table] = ["entry_id", "variable", "label", "confidence", "model"]
+    return table
+
+
+def suggest_labels(db_path, suggester, entry_ids, texts, table_name="annotations", progress=None):
+    """Run a suggester over the given entries in chunks and store its suggestions; returns how many were stored"""
+    db = get_db(db_path)
+    stored = 0
+    total = len(entry_ids)
+    for start in range(0, total, SUGGEST_CHUNK_ROWS):
+        chunk_ids = entry_ids[start:start + SUGGEST_CHUNK_ROWS]
+        predictions = suggester.predict(texts[start:start + SUGGEST_CHUNK_ROWS])
+        rows = [
+            (entry_id, variable, label, float(confidence), suggester.name)
+            for variable, (labels, confidences) in predictions.items()
+            for entry_id, label, confidence in zip(chunk_ids, labels, confidences)
+            if label is not None
+        ]
+        with db.lock:
+            table = ensure_suggestion_table(db, table_name)
+            # Replace what earlier runs suggested for these entries
+            db.conn.executemany(f"DELETE FROM {table} WHERE entry_id = ?", [(entry_id,) for entry_id in chunk_ids])
+            db.conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)", rows)
+            db.conn.commit()
+        stored += len(rows)
+        if progress:
+            progress(min(start + SUGGEST_CHUNK_ROWS, total), total)
+    return stored
+
+
+def get_suggestions(db_path, entry_id, table_name="annotations"):
+    """Suggested {variable: (label, confidence)} for one entry"""
+    db = get_db(db_path)
+    with db.lock:
+        if db.table_columns(f"{table_name}_suggestions") is None:
+            return {}
+        rows = db.conn.execute(
+            f"SELECT variable, label, confidence FROM {table_name}_suggestions WHERE entry_id = ?",
+            (entry_id,)
+        )
+        return {variable: (label, confidence) for variable, label, confidence in rows}
+
+
+def suggestion_confidence(db_path, id_index, table_name="annotations"):
+    """Lowest suggestion confidence of every row (NaN where nothing was suggested), for uncertainty ordering"""
+    confidence = np.full(len(id_index), np.nan)
+    db = get_db(db_path)
+    with db.lock:
+        if db.table_columns(f"{table_name}_suggestions") is None:
+            return confidence
+        scores = pd.read_sql(
+            f"SELECT entry_id, MIN(confidence) AS confidence FROM {table_name}_suggestions GROUP BY entry_id",
+            db.conn
+        )
+    positions = id_index.get_indexer(scores["entry_id"])
+    found = positions >= 0
+    confidence[positions[found]] = scores["confidence"].to_numpy()[found]
+    return confidence
+
+
 # --------------------------
 # Streamlit App
 # --------------------------
@@ -82,8 +993,14 @@ uploaded_db = st.sidebar.file_uploader(
 
 if uploaded_db:
     db_path = f"/tmp/{uploaded_db.name}"
-    with open(db_path, "wb") as f:
-        f.write(uploaded_db.getbuffer())
+    # Only write the upload once; rewriting it on every rerun would drop new annotations
+    if st.session_state.get("db_upload_id") != uploaded_db.file_id:
+        release_db(db_path)
+        with open(db_path, "wb") as f:
+            f.write(uploaded_db.getbuffer())
+        st.session_state.db_upload_id = uploaded_db.file_id
+        st.session_state.pop("annotated_ids_db", None)
+        st.session_state.pop("queue_key", None)
     st.session_state.db_path = db_path
     st.sidebar.success(f"Using existing DB: {uploaded_db.name}")
 
@@ -102,9 +1019,46 @@ if not st.session_state.db_path:
     st.warning("Please select or create a database to continue.")
     st.stop()
 
+# Storage format and coder
+db = get_db(st.session_state.db_path)
+with db.lock:
+    has_long_tables = db.table_columns("annotations_values") is not None
+storage = st.sidebar.radio(
+    "Storage format",
+    [STORAGE_WIDE, STORAGE_LONG],
+    index=1 if has_long_tables else 0,
+    format_func=lambda s: "Wide (one column per variable)" if s == STORAGE_WIDE
+    else "Long (one row per variable value)",
+)
+coder = st.sidebar.text_input(
+    "Coder name",
+    value="",
+    help="With a name set, entries are leased to you so coders sharing this database never work on the same entry at once"
+).strip()
+
+# Double coding: only long storage keeps one row per coder, so only it can hold two coders' labels
+double_share = 0.0
+if storage == STORAGE_LONG and coder:
+    double_share = st.sidebar.slider(
+        "Double-coded share", 0, 100, 0, step=5, format="%d%%",
+        help="Share of the entries a second coder annotates too, for the agreement measures. "
+             "Every coder should use the same value."
+    ) / 100
+
+# Report annotations the background writer could not save
+writer = get_writer(st.session_state.db_path)
+while writer.errors:
+    st.sidebar.error(f"❌ {writer.errors.pop(0)}")
+
+with st.sidebar.expander("👥 Coder throughput"):
+    # Off by default: the counts scan every saved annotation on each rerun
+    if st.toggle("Show throughput"):
+        st.dataframe(coder_throughput(st.session_state.db_path, storage=storage), hide_index=True)
+
 
 if uploaded_file:
-    df_csv = pd.read_csv(uploaded_file)
+    csv_hash = upload_hash(uploaded_file)
+    df_csv = load_csv(csv_hash, uploaded_file.getbuffer())
     st.success("CSV loaded successfully")
     st.write("Detected columns:", df_csv.columns.tolist())
 
@@ -115,6 +1069,11 @@ if uploaded_file:
         st.error("❌ ID column contains missing values.")
         st.stop()
 
+    entry_ids, texts, id_index = column_arrays(csv_hash, id_column, text_column, df_csv)
+    if not id_index.is_unique:
+        st.error("❌ ID column contains duplicate values.")
+        st.stop()
+
     # --------------------------
     # Variable definition
     # --------------------------
@@ -124,85 +1083,214 @@ if uploaded_file:
         "Examples:\n"
         "parent1:yes,no\n"
         "child1:TEXT if parent1=yes\n"
-        "child2:0,1 if parent1=no",
+        "child2:0,1 if parent1=no\n"
+        "(conditions can use =, !=, in a,b, not in a,b, and, or)",
         value="parent1:yes,no\nchild1:TEXT if parent1=yes\nchild2:0,1 if parent1=no"
     )
 
-    variables = []
-    for line in var_input.strip().splitlines():
-        if ":" not in line:
-            continue
-
-        var_part, labels_part = line.split(":", 1)
-        var_name = var_part.strip()
-        labels_part = labels_part.strip()
-
-        if "if" in labels_part:
-            labels, condition = labels_part.split("if", 1)
-            var_type = "TEXT" if labels.strip().upper() == "TEXT" else [l.strip() for l in labels.split(",")]
-            variables.append({
-                "name": var_name,
-                "type": var_type,
-                "condition": condition.strip()
-            })
-        else:
-            var_type = "TEXT" if labels_part.upper() == "TEXT" else [l.strip() for l in labels_part.split(",")]
-            variables.append({
-                "name": var_name,
-                "type": var_type,
-                "condition": None
-            })
+    try:
+        variables = compile_schema(var_input)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        st.stop()
 
     if not variables:
         st.error("❌ Please define at least one variable.")
         st.stop()
 
+    # --------------------------
+    # Analytics
+    # --------------------------
+
+    with st.sidebar.expander("📊 Analytics"):
+        # Off by default so coding is not slowed by a dashboard nobody is reading
+        if st.toggle("Show analytics"):
+            stats = get_stats(st.session_state.db_path, storage)
+            stats.refresh()
+            categorical = [var for var in variables if var["type"] != "TEXT"]
+
+            st.markdown("**Completion**")
+            st.dataframe(stats.completion(variables, total_entries=len(df_csv)), hide_index=True)
+
+            st.markdown("**Label distributions**")
+            for var in categorical:
+                distribution = stats.distribution(var["name"])
+                if len(distribution):
+                    st.caption(var["name"])
+                    st.bar_chart(distribution["count"])
+
+            st.markdown("**Agreement**")
+            shown = False
+            if len(stats.coders()) > 1:
+                for var in categorical:
+                    alpha, pairs = stats.agreement(var["name"])
+                    if pairs.empty:
+                        continue
+                    st.caption(f"{var['name']}: Krippendorff's alpha = {alpha:.3f}")
+                    st.dataframe(pairs, hide_index=True)
+                    shown = True
+            if not shown:
+                st.info("Agreement needs entries coded by at least two coders "
+                        "(long storage with coder names and a double-coded share).")
+
+    # --------------------------
+    # Pre-annotation
+    # --------------------------
+
+    with st.sidebar.expander("🤖 Label suggestions"):
+        suggester_kind = st.radio(
+            "Suggest labels from",
+            ["off", "keywords", "model"],
+            format_func={"off": "Off", "keywords": "Keyword rules",
+                         "model": "A model trained on saved annotations"}.get,
+        )
+        rules_input = ""
+        if suggester_kind == "keywords":
+            rules_input = st.text_area("Rules, one per line", placeholder="parent1=yes: great, excellent")
+        order_by_uncertainty = st.checkbox(
+            "Show least certain entries first", disabled=suggester_kind == "off"
+        ) and suggester_kind != "off"
+        run_suggestions = st.button("Suggest labels for the queue", disabled=suggester_kind == "off")
+
+    if "suggestion_message" in st.session_state:
+        st.success(st.session_state.pop("suggestion_message"))
+
     # --------------------------
     # Filter already-annotated entries
     # --------------------------
 
-    df_db = get_all_entries(st.session_state.db_path)
-    annotated_ids = set(df_db["id"].astype(str)) if not df_db.empty else set()
+    # Loaded once per database, then kept up to date by the save button
+    # With double coding, which entries count as done depends on the coder. After a
+    # failed write the ids are reloaded, so the entries that were not saved come back
+    annotated_key = (st.session_state.db_path, storage, writer.failed_batches)
+    if double_share:
+        annotated_key += (coder, double_share)
+    if st.session_state.get("annotated_ids_db") != annotated_key:
+        writer.flush()
+        st.session_state.annotated_ids = get_annotated_ids(
+            st.session_state.db_path, storage=storage, coder=coder, double_share=double_share
+        )
+        st.session_state.annotated_ids_db = annotated_key
+    annotated_ids = st.session_state.annotated_ids
+
+    # The shuffled order is fixed per uploaded file, so reruns keep the same queue
+    shuffled_orders = st.session_state.setdefault("shuffled_orders", {})
+    if csv_hash not in shuffled_orders:
+        shuffled_orders[csv_hash] = np.random.permutation(len(df_csv))
 
-    df_new = df_csv.copy()
-    if "shuffled_ids" not in st.session_state:
-        df_new = df_new.sample(frac=1, random_state=None).reset_index(drop=True)
-        st.session_state.shuffled_ids = df_new["id"].tolist()
-    else:
-        df_new = df_new.set_index("id").loc[st.session_state.shuffled_ids].reset_index()
-    df_new["id"] = df_new[id_column].astype(str)
-    df_new = df_new[~df_new["id"].isin(annotated_ids)]
-    
+    # The queue holds the row positions still to annotate; it is built once and
+    # then shrinks on save, so reruns never reshape the DataFrame
+    queue_key = (csv_hash, id_column, text_column, annotated_key,
+                 order_by_uncertainty, st.session_state.get("suggestion_runs", 0))
+    if st.session_state.get("queue_key") != queue_key:
+        order = shuffled_orders[csv_hash]
+        done = id_index.isin(annotated_ids)
+        pending = order[~done[order]]
+        if order_by_uncertainty:
+            # Active learning: the entries the suggestions are least sure about come first
+            confidence = suggestion_confidence(st.session_state.db_path, id_index)
+            pending = pending[np.argsort(np.nan_to_num(confidence[pending], nan=np.inf), kind="stable")]
+        st.session_state.queue = pending
+        st.session_state.queue_key = queue_key
+        st.session_state.prefetched = {}
+    pending = st.session_state.queue
+
+    if run_suggestions:
+        try:
+            if suggester_kind == "keywords":
+                suggester = KeywordSuggester(parse_keyword_rules(rules_input))
+            else:
+                with st.spinner("Training on saved annotations..."):
+                    suggester = train_suggester(st.session_state.db_path, variables, storage=storage)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        except ImportError:
+            st.error("❌ Model suggestions need scikit-learn (pip install scikit-learn).")
+            st.stop()
 
-    if df_new.empty:
-        st.success("🎉 All entries have already been annotated!")
+        if suggester_kind == "model" and not suggester.models:
+            st.warning(f"⚠️ A variable needs at least {SUGGEST_MIN_EXAMPLES} saved labels, "
+                       "with two different values, before a model can suggest it.")
+        else:
+            progress_bar = st.progress(0.0, text="Suggesting labels...")
+
+            def show_progress(done, total):
+                progress_bar.progress(done / total, text=f"Suggested labels for {done} / {total} entries")
+
+            stored = suggest_labels(st.session_state.db_path, suggester, entry_ids[pending], texts[pending],
+                                    progress=show_progress)
+            st.session_state.suggestion_runs = st.session_state.get("suggestion_runs", 0) + 1
+            st.session_state.suggestion_message = f"🤖 Stored {stored} label suggestions"
+            st.rerun()
+
+    # Team mode: only show the entries currently leased to this coder
+    view = pending
+    if coder:
+        def queued(ids):
+            # Leases on entries of another file, or already saved, are not this queue's
+            return np.isin(id_index.get_indexer(ids), pending)
+
+        leased, done_elsewhere = lease_entries(
+            st.session_state.db_path, coder, (entry_ids[pos] for pos in pending), storage=storage,
+            double_share=double_share, queued=queued
+        )
+        if done_elsewhere:
+            annotated_ids.update(done_elsewhere)
+            pending = st.session_state.queue = pending[~np.isin(pending, id_index.get_indexer(done_elsewhere))]
+        view = np.array(
+            [pos for pos, entry_id in zip(id_index.get_indexer(leased), leased)
+             if pos >= 0 and entry_id not in annotated_ids],
+            dtype=pending.dtype
+        )
+
+    if len(view) == 0:
+        if coder and len(pending):
+            st.info("⏳ The remaining entries are leased to other coders. Check back once their leases expire.")
+        else:
+            st.success("🎉 All entries have already been annotated!")
         st.stop()
 
-    st.info(f"🆕 {len(df_new)} entries remaining to annotate")
+    if coder:
+        st.info(f"🆕 {len(pending)} entries remaining to annotate, {len(view)} leased to you")
+    else:
+        st.info(f"🆕 {len(pending)} entries remaining to annotate")
 
     # --------------------------
     # Navigation
     # --------------------------
 
     st.sidebar.header("Navigation")
-    entry_ids = df_new["id"].tolist()
 
     current_index = st.sidebar.number_input(
         "Entry index",
         min_value=0,
-        max_value=len(entry_ids) - 1,
+        max_value=len(view) - 1,
         value=0
     )
 
-    current_entry = df_new.iloc[current_index]
+    # Moving through the queue is a lookup in the prefetched window, refilled when it runs out
+    current_position = int(view[current_index])
+    prefetched = st.session_state.prefetched
+    if current_position not in prefetched:
+        prefetched = st.session_state.prefetched = prefetch_entries(view, current_index, entry_ids, texts)
+    entry_id, entry_text = prefetched[current_position]
+
+    # Remember the version the entry had when it was opened, to catch saves by other coders
+    entry_versions = st.session_state.setdefault("entry_versions", {})
+    version_key = (st.session_state.db_path, storage, coder, entry_id)
+    if version_key not in entry_versions:
+        entry_versions[version_key] = get_version(
+            st.session_state.db_path, entry_id, storage=storage, coder=coder
+        )
 
     st.subheader(
-        f"Entry {current_index + 1} / {len(entry_ids)} (ID: {current_entry['id']})"
+        f"Entry {current_index + 1} / {len(view)} (ID: {entry_id})"
     )
 
     st.text_area(
         "Text to annotate",
-        current_entry[text_column],
+        entry_text,
         height=400
     )
 
@@ -210,30 +1298,35 @@ if uploaded_file:
     # Annotation UI
     # --------------------------
 
+    suggestions = get_suggestions(st.session_state.db_path, entry_id) if suggester_kind != "off" else {}
     selected_labels = {}
     parent_values = {}
 
+    # Variables come in dependency order, so every parent is decided before its children
     for var in variables:
         var_name = var["name"]
         var_type = var["type"]
-        condition = var["condition"]
-
-        if condition:
-            cond_var, cond_value = condition.split("=")
-            cond_var = cond_var.strip()
-            cond_value = cond_value.strip()
 
-            if parent_values.get(cond_var) != cond_value:
-                continue
+        if not condition_met(var["condition"], parent_values):
+            continue
 
         if var_type == "TEXT":
             selected_labels[var_name] = st.text_area(
                 f"{var_name} (free text)",
                 height=100
             )
+            if selected_labels[var_name].strip():
+                parent_values[var_name] = selected_labels[var_name].strip()
         else:
             options = ["— select —"] + var_type
-            choice = st.radio(var_name, options, index=0, key=f"{var_name}_{current_entry['id']}")
+            # Start from the suggested label, so accepting it takes a single click on Save
+            suggested = suggestions.get(var_name)
+            default = options.index(suggested[0]) if suggested and suggested[0] in var_type else 0
+            # The suggestion is part of the key, so a new suggestion resets the widget to it
+            choice = st.radio(var_name, options, index=default,
+                              key=f"{var_name}_{entry_id}_{suggested[0] if default else ''}")
+            if default:
+                st.caption(f"🤖 Suggested: {suggested[0]} ({suggested[1]:.0%} confident)")
 
             if choice != "— select —":
                 selected_labels[var_name] = choice
@@ -248,13 +1341,43 @@ if uploaded_file:
     if st.button("💾 Save Labels"):
         save_label(
             st.session_state.db_path,
-            current_entry["id"],
-            current_entry[text_column],
-            selected_labels)
-        st.success(f"Saved annotation for ID {current_entry['id']}")
-
-    if st.button("📤 Export All Annotations to CSV"):
-        df_export = get_all_entries(st.session_state.db_path)
-        export_path = "annotated_export.csv"
-        df_export.to_csv(export_path, index=False, encoding="utf-8")
-        st.success(f"Exported annotations to {export_path}")
+            entry_id,
+            entry_text,
+            selected_labels,
+            storage=storage,
+            coder=coder,
+            expected_version=entry_versions.pop(version_key))
+        annotated_ids.add(entry_id)
+        st.session_state.queue = pending[pending != current_position]
+        st.success(f"Saved annotation for ID {entry_id}")
+
+    export_format = st.selectbox("Export format", ["csv", "jsonl", "parquet"])
+
+    if st.button("📤 Export All Annotations"):
+        get_writer(st.session_state.db_path).flush()
+        export_path = f"annotated_export.{export_format}"
+        progress_bar = st.progress(0.0, text="Exporting annotations...")
+
+        def show_progress(done, total):
+            progress_bar.progress(min(done / total, 1.0) if total else 1.0,
+                                  text=f"Exported {done} / {total} rows")
+
+        try:
+            exported = export_annotations(
+                st.session_state.db_path,
+                export_path,
+                export_format,
+                storage=storage,
+                progress=show_progress)
+        except ImportError:
+            st.error("❌ Parquet export needs pyarrow (pip install pyarrow).")
+        else:
+            progress_bar.progress(1.0, text=f"Exported {exported} rows")
+            st.session_state.export_path = export_path
+            st.success(f"Exported annotations to {export_path}")
+
+    # Offer the last export as a download; reruns only pass the button a reader, not the file
+    export_path = st.session_state.get("export_path")
+    if export_path and os.path.exists(export_path):
+        st.download_button("⬇️ Download export", export_reader(export_path),
+                           file_name=os.path.basename(export_path))